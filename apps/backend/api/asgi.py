@@ -0,0 +1,174 @@
+"""ASGI serving mode for the API.
+
+Feed reads, /highlights/process and /highlights/generate run natively on the event loop with the async
+Firestore client and the async MLB fetchers. Every other route is served by the Flask app in main.py, so
+routes and response shapes are the same in both modes.
+
+Run with:
+    uvicorn apps.backend.api.asgi:app --host 0.0.0.0 --port 8080
+"""
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from apps.backend.api import main
+from apps.backend.api.highlight_generation.highlight_generator import generate_game_highlights
+from apps.backend.api.highlight_store.team_feed import parse_fields, parse_limit, InvalidFeedRequest
+from apps.backend.api.highlight_store.team_timeline import read_team_feed_async
+from apps.backend.api.mlb_data_fetching.team_schedules_processor import process_past_games, check_next_game, \
+    fetch_schedule_async
+from apps.backend.utils.async_http import close_async_http_client
+from apps.backend.utils.cache_utils import highlights_cache, get_team_highlights_generation, cache_team_highlights
+from apps.backend.utils.clients import get_async_firestore_client
+from apps.backend.utils.constants import GENERATION_RETRY_AFTER_SECONDS
+from apps.backend.utils.http_utils import EncodedBody, build_response_headers, etag_matches, negotiate_encoding
+from apps.backend.utils.pubsub_utils import flush_publishes, start_publish_batch, publisher
+from apps.backend.utils.retry_utils import is_rate_limited
+
+# Multi-minute generations and Firestore writes get their own threads so they never starve feed reads
+GENERATION_WORKERS = 4
+PROCESSING_WORKERS = 8
+generation_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix="generation")
+processing_executor = ThreadPoolExecutor(max_workers=PROCESSING_WORKERS, thread_name_prefix="processing")
+
+
+def _json_response(request: Request, encoded_body: EncodedBody, status: int) -> Response:
+    """The ASGI counterpart of main._json_response."""
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), len(encoded_body))
+    if etag_matches(request.headers.get("if-none-match"), encoded_body.etag):
+        return Response(status_code=304, headers=build_response_headers(encoded_body, encoding, not_modified=True))
+    return Response(encoded_body.encoded(encoding), status_code=status, media_type="application/json",
+                    headers=build_response_headers(encoded_body, encoding))
+
+
+def _error_response(message: str, status: int) -> Response:
+    return Response(main.serialize_body({"error": message}).body, status_code=status, media_type="application/json")
+
+
+async def _run_in(executor, func, *args):
+    # Runs in a copy of the request's context, so its publishes land in the request's Pub/Sub batch
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+
+
+async def get_teams(request: Request) -> Response:
+    return _json_response(request, main.teams_body, 200)
+
+
+async def get_highlights(request: Request) -> Response:
+    team_id = request.path_params["team_id"]
+    try:
+        limit = parse_limit(request.query_params.get("limit"))
+        cursor = request.query_params.get("cursor")
+        fields = parse_fields(request.query_params.get("fields"))
+    except InvalidFeedRequest as e:
+        return _error_response(str(e), 400)
+
+    cache_key = (team_id, limit, cursor, tuple(fields) if fields else None)
+    cached_body = highlights_cache.get(cache_key)
+    if cached_body is not None:
+        return _json_response(request, cached_body, 200)
+
+    try:
+        generation = get_team_highlights_generation(team_id)
+        feed_page = await read_team_feed_async(get_async_firestore_client(), team_id, limit=limit, cursor=cursor, fields=fields)
+
+        if not feed_page["highlights"] and not cursor:
+            return _error_response(f"No highlights found for team {team_id}", 404)
+
+        body = main.serialize_body(feed_page)
+        cache_team_highlights(cache_key, body, generation)
+        return _json_response(request, body, 200)
+
+    except InvalidFeedRequest as e:
+        return _error_response(str(e), 400)
+    except Exception as e:
+        logging.error(f"Error fetching highlights for team {team_id}: {e}")
+        return _error_response(f"An internal error occurred - {str(e)}", 500)
+
+
+async def get_highlights_cache_stats(request: Request) -> Response:
+    return Response(main.serialize_body(highlights_cache.stats()).body, media_type="application/json")
+
+
+async def process_highlights(request: Request) -> Response:
+    season = request.path_params["season"]
+    date_param = request.query_params.get("date")
+    if not date_param:
+        return _error_response("Missing required parameter: date (YYYY-MM-DD)", 400)
+    try:
+        datetime.strptime(date_param, "%Y-%m-%d")
+    except ValueError:
+        return _error_response("Invalid date format. Use YYYY-MM-DD.", 400)
+
+    try:
+        team_param = request.query_params.get("teamId")
+        team_id = int(team_param) if team_param else None
+
+        batch = start_publish_batch()
+        # One non-blocking schedule fetch shared by both passes, the Firestore work runs off the event loop
+        schedule = await fetch_schedule_async(season, team_id, date_param)
+        past_highlights, next_game = await asyncio.gather(
+            _run_in(processing_executor, process_past_games, season, team_id, date_param, schedule),
+            _run_in(processing_executor, check_next_game, season, team_id, date_param, schedule),
+        )
+        await _run_in(processing_executor, flush_publishes, batch)
+
+        response = {
+            "processedHighlights": past_highlights,
+            "nextGame": next_game if next_game else "No upcoming games within 7 days.",
+            "message": f"Highlights processed for {date_param} {f'and team {team_id}' if team_id else ''}"
+        }
+        return Response(main.serialize_body(response).body, media_type="application/json")
+
+    except Exception as e:
+        logging.error(f"Error processing highlights: {e}")
+        return _error_response(f"An internal error occurred - {str(e)}", 500)
+
+
+async def generate_highlights(request: Request) -> Response:
+    game_pk = request.path_params["game_pk"]
+    try:
+        # The feed is streamed and pruned on the generation thread, never parsed whole on the event loop
+        regenerate = request.query_params.get("regenerate", "").lower() == "true"
+        generated_highlights = await _run_in(generation_executor, generate_game_highlights, game_pk, regenerate)
+        return Response(main.serialize_body(generated_highlights).body, media_type="application/json")
+    except Exception as e:
+        logging.error(f"Error generating highlights for game_pk: {game_pk}: {e}")
+        if is_rate_limited(e):
+            response = _error_response(f"Rate limited - {str(e)}", 429)
+            response.headers["Retry-After"] = str(GENERATION_RETRY_AFTER_SECONDS)
+            return response
+        return _error_response(f"An internal error occurred - {str(e)}", 500)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await close_async_http_client()
+    publisher.close()
+    generation_executor.shutdown(wait=False)
+    processing_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/teams", get_teams, methods=["GET"]),
+        Route("/highlights/cache/stats", get_highlights_cache_stats, methods=["GET"]),
+        Route("/highlights/{team_id:int}", get_highlights, methods=["GET"]),
+        Route("/highlights/process/{season:int}/", process_highlights, methods=["GET"]),
+        Route("/highlights/generate/{game_pk:str}", generate_highlights, methods=["GET"]),
+        # Writes and anything else keep going through the Flask routes
+        Mount("/", app=WsgiToAsgi(main.app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,190 @@
+import sys
+from typing import Dict, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+
+# The keys of a play record, in the order extract_play_by_play has always produced them
+PLAY_FIELDS = ("description", "inning", "half", "event", "away_score", "home_score", "batter", "pitcher",
+               "captivating_index")
+HALVES = ("Top", "Bottom")
+
+
+class StringDictionary:
+    """Dictionary encoding of a string column: every distinct value is interned once and stored as a code."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def encode(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        return code
+
+    def code_of(self, value: str) -> int:
+        """The code of value, or -1 if the column never holds it."""
+        return self._codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class PlayTable:
+    """Columnar play-by-play of a game.
+
+    Numeric columns (inning, half, scores, captivating index) are NumPy arrays. Events and player names are
+    dictionary encoded, so "Strikeout" or a pitcher's name is stored once per game instead of once per play.
+    Indexing a row returns the same dict extract_play_by_play used to return, and str() renders exactly
+    what str() of that list of dicts did, without building the dicts.
+
+    Vectorized selection works on the columns, e.g. table.take(table.captivating_index >= 50).
+    """
+
+    def __init__(self, description: List[str], inning: np.ndarray, is_bottom: np.ndarray, event: np.ndarray,
+                 away_score: np.ndarray, home_score: np.ndarray, batter: np.ndarray, pitcher: np.ndarray,
+                 captivating_index: np.ndarray, events: StringDictionary, players: StringDictionary):
+        self.description = description
+        self.inning = inning
+        self.is_bottom = is_bottom
+        self.event_codes = event
+        self.away_score = away_score
+        self.home_score = home_score
+        self.batter_codes = batter
+        self.pitcher_codes = pitcher
+        self.captivating_index = captivating_index
+        self.events = events
+        self.players = players
+
+    @classmethod
+    def from_plays(cls, plays: Iterable[dict]) -> "PlayTable":
+        """Builds the table from GUMBO liveData.plays.allPlays entries, straight into the columns."""
+        columns = {field: [] for field in PLAY_FIELDS}
+        for play in plays:
+            result = play["result"]
+            about = play["about"]
+            match_up = play["matchup"]
+            columns["description"].append(result["description"])
+            columns["inning"].append(about["inning"])
+            columns["half"].append(HALVES[0] if about["isTopInning"] else HALVES[1])
+            columns["event"].append(result["event"])
+            columns["away_score"].append(result["awayScore"])
+            columns["home_score"].append(result["homeScore"])
+            columns["batter"].append(match_up["batter"]["fullName"])
+            columns["pitcher"].append(match_up["pitcher"]["fullName"])
+            columns["captivating_index"].append(about["captivatingIndex"])
+        return cls._from_columns(columns)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "PlayTable":
+        """Builds the table from play records shaped like the rows, e.g. a list of old play dicts."""
+        columns = {field: [] for field in PLAY_FIELDS}
+        for record in records:
+            for field in PLAY_FIELDS:
+                columns[field].append(record[field])
+        return cls._from_columns(columns)
+
+    @classmethod
+    def _from_columns(cls, columns: Dict[str, list]) -> "PlayTable":
+        events = StringDictionary()
+        players = StringDictionary()
+        return cls(
+            description=columns["description"],
+            inning=np.asarray(columns["inning"], dtype=np.int16),
+            is_bottom=np.asarray([half == HALVES[1] for half in columns["half"]], dtype=bool),
+            event=np.asarray([events.encode(event) for event in columns["event"]], dtype=np.int32),
+            away_score=np.asarray(columns["away_score"], dtype=np.int16),
+            home_score=np.asarray(columns["home_score"], dtype=np.int16),
+            batter=np.asarray([players.encode(name) for name in columns["batter"]], dtype=np.int32),
+            pitcher=np.asarray([players.encode(name) for name in columns["pitcher"]], dtype=np.int32),
+            captivating_index=_numeric_column(columns["captivating_index"]),
+            events=events,
+            players=players,
+        )
+
+    def __len__(self) -> int:
+        return len(self.description)
+
+    def __getitem__(self, index: int) -> dict:
+        """The play at index, as the dict extract_play_by_play used to build."""
+        return dict(zip(PLAY_FIELDS, self.row(index)))
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self[index] for index in range(len(self)))
+
+    def row(self, index: int) -> tuple:
+        """The play at index as a tuple of plain Python values, in PLAY_FIELDS order."""
+        return (
+            self.description[index],
+            self.inning[index].item(),
+            HALVES[int(self.is_bottom[index])],
+            self.events.values[self.event_codes[index]],
+            self.away_score[index].item(),
+            self.home_score[index].item(),
+            self.players.values[self.batter_codes[index]],
+            self.players.values[self.pitcher_codes[index]],
+            self.captivating_index[index].item(),
+        )
+
+    def rows(self) -> Iterator[tuple]:
+        return (self.row(index) for index in range(len(self)))
+
+    def column(self, field: str) -> Union[np.ndarray, List[str]]:
+        """A column by its record key, decoded to strings for the dictionary-encoded ones."""
+        if field == "half":
+            return [HALVES[int(is_bottom)] for is_bottom in self.is_bottom]
+        if field == "event":
+            return [self.events.values[code] for code in self.event_codes]
+        if field in ("batter", "pitcher"):
+            return [self.players.values[code] for code in getattr(self, f"{field}_codes")]
+        return getattr(self, field)
+
+    def event_mask(self, *events: str) -> np.ndarray:
+        """A boolean mask of the plays whose event is one of events."""
+        codes = [self.events.code_of(event) for event in events]
+        return np.isin(self.event_codes, [code for code in codes if code >= 0])
+
+    def player_mask(self, name: str) -> np.ndarray:
+        """A boolean mask of the plays the player batted or pitched in."""
+        code = self.players.code_of(name)
+        return (self.batter_codes == code) | (self.pitcher_codes == code)
+
+    def take(self, selection: Union[np.ndarray, Sequence[int]]) -> "PlayTable":
+        """The plays selected by a boolean mask or by indices, in that order, sharing this table's dictionaries."""
+        selection = np.asarray(selection)
+        indices = np.flatnonzero(selection) if selection.dtype == bool else selection.astype(int)
+        return PlayTable(
+            description=[self.description[index] for index in indices],
+            inning=self.inning[indices],
+            is_bottom=self.is_bottom[indices],
+            event=self.event_codes[indices],
+            away_score=self.away_score[indices],
+            home_score=self.home_score[indices],
+            batter=self.batter_codes[indices],
+            pitcher=self.pitcher_codes[indices],
+            captivating_index=self.captivating_index[indices],
+            events=self.events,
+            players=self.players,
+        )
+
+    def to_records(self) -> List[dict]:
+        return list(self)
+
+    def __str__(self) -> str:
+        # Renders str(self.to_records()) without building the dicts, prompts built from it are unchanged
+        return "[" + ", ".join(
+            "{" + ", ".join(f"{field!r}: {value!r}" for field, value in zip(PLAY_FIELDS, row)) + "}"
+            for row in self.rows()) + "]"
+
+    __repr__ = __str__
+
+
+def _numeric_column(values: list) -> np.ndarray:
+    """Keeps whole numbers as integers so they render as they did, e.g. 35 and not 35.0."""
+    column = np.asarray(values)
+    if column.dtype.kind in "iub":
+        return column.astype(np.int32)
+    return column.astype(np.float64)
@@ -0,0 +1,140 @@
+"""Content-addressed cache of Gemini generations.
+
+A generation is keyed by the SHA-256 of everything that decides its output: the settings the model is built with
+(its name, generation config and system instruction, see generative_model_config), the per-call generation config
+and the prompt. Results are kept in memory (LRU
+with a TTL) and in GCS under generation-cache/<key>.json, so retries from ai-processing-service and repeated
+/highlights/generate calls on any instance reuse them instead of paying for the same prompt again. Pass
+bypass=True to generate anyway, e.g. for a deliberate regeneration; its result replaces the cached one.
+"""
+import hashlib
+import json
+import time
+from typing import Callable, Optional
+
+from apps.backend.utils.cache_utils import TTLCache
+from apps.backend.utils.constants import GENERATION_CACHE_MAX_ENTRIES, GENERATION_CACHE_TTL_SECONDS
+from apps.backend.utils.gcs_utils import upload_bytes, download_bytes
+from apps.backend.utils.log_util import logger
+from apps.backend.utils.rate_limiter import rate_limiter
+
+GCS_PREFIX = "generation-cache"
+
+
+def generation_cache_key(model_settings: dict, prompt: str, generation_config: Optional[dict] = None) -> str:
+    """The SHA-256 of the model settings, generation_config and prompt.
+
+    Args:
+        model_settings: The model_name, generation_config and system_instruction the model is built with,
+            e.g. STORY_GEN_MODEL_SETTINGS.
+        prompt: The prompt.
+        generation_config: The per-call generation config, a dict of plain values.
+
+    Raises:
+        TypeError: A setting is not JSON-serializable, so it cannot be keyed reliably.
+    """
+    key_parts = {
+        "model": model_settings["model_name"],
+        "modelGenerationConfig": model_settings.get("generation_config"),
+        "systemInstruction": model_settings.get("system_instruction"),
+        "generationConfig": generation_config,
+        "prompt": prompt,
+    }
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """Two-tier (memory, then GCS) cache of generated texts, see the module docstring.
+
+    Args:
+        bucket_name: The GCS bucket, defaults to the configured bucket.
+        max_entries: The number of generations kept in memory.
+        ttl_seconds: How long a generation is reused, in both tiers.
+    """
+
+    def __init__(self, bucket_name: Optional[str] = None, max_entries: int = GENERATION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = GENERATION_CACHE_TTL_SECONDS):
+        self._bucket_name = bucket_name
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.gcs_hits = 0
+
+    @property
+    def bucket_name(self) -> str:
+        if self._bucket_name is None:
+            from apps.backend.config import BUCKET_URI
+            self._bucket_name = BUCKET_URI.replace("gs://", "")
+        return self._bucket_name
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+        try:
+            entry = json.loads(download_bytes(f"gs://{self.bucket_name}/{GCS_PREFIX}/{key}.json"))
+        except Exception:
+            # Missing, or GCS is unavailable: the generation runs
+            return None
+        age = time.time() - entry.get("createdAt", 0)
+        if age > self.ttl_seconds:
+            return None
+        self.gcs_hits += 1
+        self.memory.set(key, entry["text"], self.ttl_seconds - age)
+        return entry["text"]
+
+    def set(self, key: str, text: str, model_name: str):
+        self.memory.set(key, text)
+        entry = {"text": text, "model": model_name, "createdAt": time.time()}
+        try:
+            upload_bytes(self.bucket_name, f"{GCS_PREFIX}/{key}.json",
+                         json.dumps(entry, ensure_ascii=False).encode("utf-8"), "application/json")
+        except Exception as e:
+            logger.warning(f"Could not store generation {key} in GCS: {e}")
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), "gcsHits": self.gcs_hits}
+
+
+generation_cache = GenerationCache()
+
+
+def generate_text(model, model_settings: dict, prompt: str, generation_config: Optional[dict] = None,
+                  bypass: bool = False, validate: Optional[Callable[[str], object]] = None,
+                  backend: str = "gemini") -> Optional[str]:
+    """The stripped text model generates for prompt, from the cache when it was generated before.
+
+    Args:
+        model: A GenerativeModel.
+        model_settings: The settings model was built with, part of the cache key, e.g. STORY_GEN_MODEL_SETTINGS.
+        prompt: The prompt.
+        generation_config: A generation config dict passed to generate_content, part of the cache key.
+        bypass: Generate even when cached, and replace the cached text.
+        validate: Raises when a text is unusable, e.g. json.loads, such texts are returned but not cached.
+        backend: The rate limiter bucket generations are made through, e.g. "gemini.story".
+
+    Returns:
+        The generated text, or None when the response has no text (which is not cached).
+    """
+    key = generation_cache_key(model_settings, prompt, generation_config)
+    if not bypass:
+        text = generation_cache.get(key)
+        if text is not None:
+            logger.info(f"Reusing cached generation {key[:12]} of {model_settings['model_name']}")
+            return text
+
+    if generation_config is None:
+        response = rate_limiter.call(backend, model.generate_content, prompt)
+    else:
+        response = rate_limiter.call(backend, model.generate_content, prompt, generation_config=generation_config)
+    if not response or not response.text:
+        return None
+    text = response.text.strip()
+    try:
+        if validate is not None:
+            validate(text)
+    except Exception as e:
+        logger.warning(f"Not caching generation {key[:12]}, it is not valid: {e}")
+    else:
+        generation_cache.set(key, text, model_settings["model_name"])
+    return text
+
@@ -1,28 +1,60 @@
-import google.generativeai as genai
-from vertexai.preview.vision_models import ImageGenerationModel
-
 from apps.backend.api.highlight_generation.instructions_garden import provide_imagen_prompt_gen_instructions
-from apps.backend.config import GEMINI_API_KEY
+from apps.backend.utils.clients import lazy_client, configure_genai, init_vertex_ai
 
+IMAGEN_MODEL_NAME = "imagen-3.0-generate-001"
+GEMINI_MODEL_NAME = "gemini-2.0-flash-exp"
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json"}
 
-class GenerativeModelConfig:
+# What each Gemini model is built with, plain values so generations can be keyed on them
+STORY_GEN_MODEL_SETTINGS = {
+    "model_name": GEMINI_MODEL_NAME,
+    "generation_config": JSON_GENERATION_CONFIG,
+    "system_instruction": None,
+}
+IMAGEN_PROMPT_GEN_MODEL_SETTINGS = {
+    "model_name": GEMINI_MODEL_NAME,
+    "generation_config": JSON_GENERATION_CONFIG,
+    "system_instruction": provide_imagen_prompt_gen_instructions(),
+}
 
-    def __init__(self):
-        genai.configure(api_key=GEMINI_API_KEY)
 
-    story_gen_model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
-        generation_config=genai.GenerationConfig(
-            response_mime_type="application/json"
-        ),
-    )
+class _LazyModel:
+    """A class attribute whose model is built (and its SDK imported) on first access instead of at import."""
+
+    def __init__(self, factory):
+        self._getter = lazy_client(factory)
+
+    def __get__(self, instance, owner):
+        return self._getter()
 
-    imagen_prompt_gen_model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash-exp",
-        generation_config=genai.GenerationConfig(
-            response_mime_type="application/json"
-        ),
-        system_instruction=provide_imagen_prompt_gen_instructions()
+
+def _build_gemini_model(settings: dict):
+    genai = configure_genai()
+    return genai.GenerativeModel(
+        model_name=settings["model_name"],
+        generation_config=genai.GenerationConfig(**settings["generation_config"]),
+        system_instruction=settings["system_instruction"]
     )
 
-    imagen3_model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
+
+def _build_story_gen_model():
+    return _build_gemini_model(STORY_GEN_MODEL_SETTINGS)
+
+
+def _build_imagen_prompt_gen_model():
+    return _build_gemini_model(IMAGEN_PROMPT_GEN_MODEL_SETTINGS)
+
+
+def _build_imagen3_model():
+    init_vertex_ai()
+    from vertexai.preview.vision_models import ImageGenerationModel
+    return ImageGenerationModel.from_pretrained(IMAGEN_MODEL_NAME)
+
+
+class GenerativeModelConfig:
+
+    story_gen_model = _LazyModel(_build_story_gen_model)
+
+    imagen_prompt_gen_model = _LazyModel(_build_imagen_prompt_gen_model)
+
+    imagen3_model = _LazyModel(_build_imagen3_model)
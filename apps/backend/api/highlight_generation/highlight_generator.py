@@ -1,13 +1,14 @@
-import json
 import logging
-import time
-
-from google.cloud import firestore
 
 from apps.backend.api.highlight_generation.storyboard_generator import build_story_board
-from apps.backend.api.mlb_data_fetching.gumbo_processor import fetch_single_game_data, extract_play_by_play, \
+from apps.backend.api.highlight_store.storyboard_store import to_document as storyboard_to_document
+from apps.backend.api.highlight_store.team_timeline import write_highlight
+from apps.backend.api.mlb_data_fetching.gumbo_processor import fetch_game_extract, extract_play_by_play, \
     extract_game_overview
 from apps.backend.api.mlb_data_fetching.team_schedules_processor import get_current_datetime
+from apps.backend.utils.cache_utils import invalidate_team_highlights
+from apps.backend.utils.clients import get_firestore_client
+from apps.backend.utils.retry_utils import is_rate_limited
 
 # Configure detailed logging
 logging.basicConfig(
@@ -18,18 +19,17 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-db = firestore.Client(
-    project="slimeify",  # Your Google Cloud project ID
-    database="mlb-sluggers"
-)
 
+def generate_game_highlights(game_pk_str, regenerate=False):
+    """Generate highlights for a finalized game.
 
-def generate_game_highlights(game_pk_str):
-    """Generate highlights for a finalized game with rate limit handling."""
+    Only the parts of the feed the generation reads are extracted, while the feed is streamed. Gemini results
+    of identical prompts are reused from the generation cache unless regenerate is set.
+    """
     logger.info(f"Starting highlight generation for game {game_pk_str}")
     try:
         # Fetch game data with detailed logging
-        game_data = fetch_single_game_data(game_pk_str)
+        game_data = fetch_game_extract(game_pk_str)
         logger.info("Successfully fetched game data")
 
         logger.info("Extracting play-by-play data...")
@@ -37,35 +37,31 @@ def generate_game_highlights(game_pk_str):
         logger.info(f"Extracted {len(play_by_play)} plays")
         logger.info("Extracting game overview...")
         game_overview = extract_game_overview(game_data)
-        # Build storyboard with rate limit handling
+        # Build storyboard, a rate limit error is raised for the caller to retry with backoff off the request path
         logger.info("Building storyboard...")
-        try:
-            storyboard = build_story_board(play_by_play, game_overview, game_pk_str)
-            logger.info("Successfully built storyboard")
-            # logger.debug("First scene: %s", storyboard.scenes[0] if storyboard.scenes else 'No scenes')
-        except Exception as e:
-            if "429" in str(e):
-                logger.error("Rate limit hit during storyboard generation. Waiting before retry...")
-                time.sleep(60)  # Wait 60 seconds before retry
-                storyboard = build_story_board(play_by_play, game_overview, game_pk_str)
-            else:
-                raise
+        storyboard = build_story_board(play_by_play, game_overview, game_pk_str, regenerate)
+        logger.info("Successfully built storyboard")
+        # logger.debug("First scene: %s", storyboard.scenes[0] if storyboard.scenes else 'No scenes')
 
         # Update Firestore with the serialized storyboard
         logger.debug("Updating Firestore...")
-        doc_ref = db.collection("highlights").document(game_pk_str)
-        doc_ref.update({
-            "storyboard": json.dumps(storyboard, indent=4),  # Convert to dict before storing
+        storyboard_update = {
+            # Native map, large scenes are moved to a compressed GCS object
+            "storyboard": storyboard_to_document(storyboard, game_pk_str),
             "updatedAt": get_current_datetime()
-        })
+        }
+        # Writes the highlight and both team timelines in one transaction
+        write_highlight(get_firestore_client(), game_pk_str, lambda existing: ("update", storyboard_update))
+        teams = game_data["gameData"]["teams"]
+        invalidate_team_highlights(teams["home"]["id"], teams["away"]["id"])
         logger.info("Successfully updated Firestore")
 
         return storyboard
 
     except Exception as e:
         logger.error(f"Error generating highlights for game {game_pk_str}: {str(e)}", exc_info=True)
-        if "429" in str(e):
-            logger.error("Rate limit exceeded. Consider implementing backoff strategy.")
+        if is_rate_limited(e):
+            logger.error("Rate limit exceeded, the caller retries with backoff.")
         raise
 
 
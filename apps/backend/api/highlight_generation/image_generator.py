@@ -1,94 +1,96 @@
 import logging
+from typing import Iterable
 
-from google.cloud import aiplatform, storage
+from apps.backend.api.genai.generative_model_config import GenerativeModelConfig, IMAGEN_MODEL_NAME
+from apps.backend.api.highlight_generation.image_store import image_key, find_image, store_images, \
+    image_url_exists
+from apps.backend.api.highlight_generation.prompt_index import prompt_index
+from apps.backend.config import BUCKET_URI
+from apps.backend.utils.cache_utils import SingleFlight
+from apps.backend.utils.constants import IMAGEN_VARIANT_COUNT
+from apps.backend.utils.rate_limiter import rate_limiter
 
-from apps.backend.api.genai.generative_model_config import GenerativeModelConfig
-from apps.backend.config import PROJECT_ID, REGION, BUCKET_URI
-
-aiplatform.init(project=PROJECT_ID, location=REGION, staging_bucket=BUCKET_URI)
-imagen3_model = GenerativeModelConfig().imagen3_model
-storage_client = storage.Client()
 bucket_name = BUCKET_URI.replace('gs://', '')
 logger = logging.getLogger(__name__)
-storage_client_uri_prefix = "https://storage.googleapis.com/"
+# Part of the stored image key, an image generated with other settings is another image
+IMAGEN_SAFETY_SETTINGS = {
+    "language": "en",
+    "safety_filter_level": "block_some",
+    "person_generation": "dont_allow",
+}
+_image_generations = SingleFlight()
 
 
-def generate_image(prompt: str, aspect_ratio):
-    """Generate an image using Vertex AI's Imagen model."""
+def generate_image(prompt: str, aspect_ratio, number_of_images: int = IMAGEN_VARIANT_COUNT):
+    """Generate images using Vertex AI's Imagen model, returned inline rather than written to the bucket."""
     logger.debug(f"Generating image with prompt: {prompt[:100]}...")  # Log first 100 chars of prompt
 
     try:
-        response = imagen3_model.generate_images(
+        response = rate_limiter.call(
+            "imagen3",
+            GenerativeModelConfig.imagen3_model.generate_images,
             prompt=prompt,
-            number_of_images=4,
+            number_of_images=number_of_images,
             aspect_ratio=aspect_ratio,
-            language="en",
-            safety_filter_level="block_some",
-            person_generation="dont_allow",
-            output_gcs_uri=BUCKET_URI
+            **IMAGEN_SAFETY_SETTINGS
         )
 
         if not response or not response.images:
             logger.error("Image generation failed - no images returned")
             return None
 
-        logger.debug("Successfully generated image")
-        return response.images[0]
+        logger.debug(f"Successfully generated {len(response.images)} images")
+        return response.images
 
     except Exception as e:
         logger.error(f"Failed to generate image: {str(e)}", exc_info=True)
         return None
 
 
-def upload_image_to_gcs(prompt: str, game_pk: str, scene_number: int, is_story_image: bool = False) -> str:
-    """Generate and upload an image to GCS."""
-    try:
-        scene_image = generate_image(prompt, "3:4" if not is_story_image else "4:3")
-
-        if not scene_image:
-            logger.warning("No image generated, using placeholder")
-            return get_placeholder_image_url()
-
-        # image_name = f"/tmp/game_{game_pk}_{'story' if is_story_image else f'scene_{scene_number}'}.png"
-        # image_bytes = scene_image.show
-        # bucket = storage_client.bucket(bucket_name)
-        # blob = bucket.blob(image_name)
-
-        # Convert image to byte stream
-        # image_bytes = io.BytesIO()
-        # image_bytes.write(scene_image.save(image_name))
+def upload_image_to_gcs(prompt: str, game_pk: str, scene_number: int, is_story_image: bool = False,
+                        teams: Iterable[str] = ()) -> str:
+    """Generate and upload an image to GCS, or reuse the stored image of an identical or near-identical request.
 
-        logger.debug("scene_image._gcs_uri is: %s", f"{scene_image._gcs_uri}")
-
-        # scene_image.save(image_name, False)
+    An image generated for a near-identical prompt is only reused when it was generated for the same teams.
+    """
+    try:
+        aspect_ratio = "3:4" if not is_story_image else "4:3"
+        key = image_key(prompt, aspect_ratio, IMAGEN_MODEL_NAME, IMAGEN_SAFETY_SETTINGS)
+        # Concurrent identical requests share one generation
+        return _image_generations.do(key, lambda: _find_or_generate_image(key, prompt, aspect_ratio, teams))
 
-        # logger.debug("scene_image._gcs_uri is: %s", f"{scene_image._gcs_uri}")
-        # logger.debug("scene_image._image_bytes is: %s", f"{scene_image._image_bytes[:300]}")
-        # blob_url = upload_blob_from_stream(
-        #     bucket_name=bucket_name,
-        #     destination_blob_name=image_name,
-        #     content=image_bytes
-        # )
+    except Exception as e:
+        logger.error(f"Failed to upload image for game {game_pk} scene {scene_number}: {str(e)}", exc_info=True)
+        return get_placeholder_image_url()
 
-        # Upload the image
-        # blob.upload_from_file(scene_image_file, content_type="image/png")
-        scene_image_gcs_url = scene_image._gcs_uri.replace('gs://', '')
 
-        storage_client_url = f"{storage_client_uri_prefix}{scene_image_gcs_url}"
-        logger.info("Successfully uploaded image: %s", storage_client_url)
-        return storage_client_url
+def _find_or_generate_image(key: str, prompt: str, aspect_ratio: str, teams: Iterable[str]) -> str:
+    stored_url = find_image(bucket_name, key)
+    if stored_url:
+        logger.info("Reusing stored image: %s", stored_url)
+        return stored_url
+    similar = prompt_index.find_similar(prompt, aspect_ratio, teams)
+    if similar and image_url_exists(bucket_name, similar["url"]):
+        logger.info("Reusing image %s of a similar prompt (%s)", similar["url"], similar["similarity"])
+        return similar["url"]
 
-    except Exception as e:
-        logger.error(f"Failed to upload image: {str(e)}", exc_info=True)
+    images = generate_image(prompt, aspect_ratio)
+    if not images:
+        logger.warning("No image generated, using placeholder")
         return get_placeholder_image_url()
 
+    storage_client_url = store_images(bucket_name, key, images)
+    prompt_index.add(prompt, aspect_ratio, teams, storage_client_url)
+    logger.info("Successfully uploaded image: %s", storage_client_url)
+    return storage_client_url
+
 
 def get_placeholder_image_url() -> str:
     """Return a placeholder image URL when generation fails."""
     return f"{BUCKET_URI}/placeholder_image.png"  # Update with your actual placeholder image
 
 
-def upload_story_list_image_to_gcs(storyboard, game_pk: str) -> str:
+def upload_story_list_image_to_gcs(storyboard, game_pk: str, teams: Iterable[str] = ()) -> str:
     """Upload the story list image to GCS."""
     try:
         # Get the first scene's prompt for the story image
@@ -101,7 +103,8 @@ def upload_story_list_image_to_gcs(storyboard, game_pk: str) -> str:
             prompt=first_scene.imagenPrompt,
             game_pk=game_pk,
             scene_number=0,
-            is_story_image=True
+            is_story_image=True,
+            teams=teams
         )
 
     except Exception as e:
@@ -0,0 +1,137 @@
+"""Content-addressed store of the images Imagen generated, and a sweeper of the ones no highlight uses.
+
+An image is stored under generated-images/<key>/<variant>.png, where key is the SHA-256 of everything that
+decides it: the prompt, the aspect ratio, the model and the safety settings. Identical requests (retries,
+regenerations, repeated scenes) find the stored image instead of calling Imagen again.
+
+Run the sweeper from a shell, it only lists what it would delete without --delete:
+    python -m apps.backend.api.highlight_generation.image_store --delete
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+from typing import Iterable, Iterator, Optional, Set
+
+from apps.backend.api.highlight_store.storyboard_store import rehydrate
+from apps.backend.api.highlight_store.team_feed import HIGHLIGHTS_COLLECTION
+from apps.backend.utils.constants import GENERATED_IMAGE_SWEEP_MIN_AGE_SECONDS
+from apps.backend.utils.gcs_utils import upload_bytes, blob_exists, list_blobs, list_prefixes
+from apps.backend.utils.log_util import logger
+
+IMAGE_PREFIX = "generated-images"
+STORAGE_URL_PREFIX = "https://storage.googleapis.com/"
+# Where Imagen wrote its outputs before images were stored by key: <request id>/sample_<n>.png at the bucket's root
+LEGACY_OUTPUT_PREFIX = re.compile(r"\d+/")
+LEGACY_OUTPUT_NAME = re.compile(r"\d+/sample_\d+\.png")
+
+
+def image_key(prompt: str, aspect_ratio: str, model_name: str, safety_settings: dict) -> str:
+    key_parts = {"prompt": prompt, "aspectRatio": aspect_ratio, "model": model_name, "safety": safety_settings}
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def image_blob_name(key: str, variant: int = 0) -> str:
+    return f"{IMAGE_PREFIX}/{key}/{variant}.png"
+
+
+def public_url(bucket_name: str, blob_name: str) -> str:
+    return f"{STORAGE_URL_PREFIX}{bucket_name}/{blob_name}"
+
+
+def find_image(bucket_name: str, key: str) -> Optional[str]:
+    """The URL of the stored image of key, or None."""
+    blob_name = image_blob_name(key)
+    return public_url(bucket_name, blob_name) if blob_exists(bucket_name, blob_name) else None
+
+
+def image_url_exists(bucket_name: str, url: str) -> bool:
+    """Whether the image of a URL of the bucket is still stored, the sweeper may have removed it."""
+    prefix = public_url(bucket_name, "")
+    return url.startswith(prefix) and blob_exists(bucket_name, url[len(prefix):])
+
+
+def store_images(bucket_name: str, key: str, images: Iterable) -> str:
+    """Uploads the generated images (variants) of key and returns the URL of the first one."""
+    for variant, image in enumerate(images):
+        upload_bytes(bucket_name, image_blob_name(key, variant), image._image_bytes, "image/png")
+    return public_url(bucket_name, image_blob_name(key))
+
+
+def referenced_image_urls(db) -> Set[str]:
+    """The story and scene image URLs of every highlight."""
+    urls = set()
+    for snapshot in db.collection(HIGHLIGHTS_COLLECTION).stream():
+        try:
+            storyboard = rehydrate((snapshot.to_dict() or {}).get("storyboard")) or {}
+        except Exception as e:
+            # Unknown references: sweeping could delete images in use
+            raise RuntimeError(f"Could not read the storyboard of game {snapshot.id}: {e}") from e
+        urls.add(storyboard.get("storyImageUrl"))
+        urls.update(scene.get("imageUrl") for scene in storyboard.get("scenes") or [])
+    urls.discard(None)
+    urls.discard("")
+    return urls
+
+
+def sweep_generated_images(db, bucket_name: str, delete: bool = False,
+                           min_age_seconds: float = GENERATED_IMAGE_SWEEP_MIN_AGE_SECONDS) -> dict:
+    """Removes the generated images no highlight references.
+
+    Only generated-images/ and the outputs Imagen wrote before images were stored by key are swept, nothing else
+    in the bucket is listed. Stored images are kept with all their variants while any variant is referenced, older
+    outputs only when referenced themselves. Images younger than min_age_seconds are never removed, they may belong
+    to a generation still running.
+
+    Args:
+        db: The Firestore client.
+        bucket_name: The bucket of the images.
+        delete: Delete the unreferenced images, they are only counted otherwise.
+        min_age_seconds: The age under which an image is kept.
+
+    Returns:
+        The number of images kept, and unreferenced (deleted when delete is set) with their bytes.
+    """
+    referenced = referenced_image_urls(db)
+    referenced_keys = {url[len(public_url(bucket_name, IMAGE_PREFIX)) + 1:].split("/", 1)[0]
+                       for url in referenced if url.startswith(public_url(bucket_name, IMAGE_PREFIX) + "/")}
+    counts = {"kept": 0, "unreferenced": 0, "unreferencedBytes": 0, "deleted": 0}
+    now = time.time()
+    for blob in _generated_image_blobs(bucket_name):
+        if blob.name.startswith(f"{IMAGE_PREFIX}/"):
+            in_use = blob.name.split("/")[1] in referenced_keys
+        else:
+            in_use = public_url(bucket_name, blob.name) in referenced
+        if in_use or now - blob.updated.timestamp() < min_age_seconds:
+            counts["kept"] += 1
+            continue
+        counts["unreferenced"] += 1
+        counts["unreferencedBytes"] += blob.size or 0
+        if delete:
+            blob.delete()
+            counts["deleted"] += 1
+    logger.info(f"Swept the generated images of gs://{bucket_name}: {counts}")
+    return counts
+
+
+def _generated_image_blobs(bucket_name: str) -> Iterator:
+    """The images stored by key, then the older Imagen outputs."""
+    for blob in list_blobs(bucket_name, f"{IMAGE_PREFIX}/"):
+        if blob.name.endswith(".png"):
+            yield blob
+    for prefix in list_prefixes(bucket_name):
+        if LEGACY_OUTPUT_PREFIX.fullmatch(prefix):
+            yield from (blob for blob in list_blobs(bucket_name, prefix) if LEGACY_OUTPUT_NAME.fullmatch(blob.name))
+
+
+if __name__ == "__main__":
+    from apps.backend.config import BUCKET_URI
+    from apps.backend.utils.clients import get_firestore_client
+
+    parser = argparse.ArgumentParser(description="Remove the generated images no highlight references.")
+    parser.add_argument("--delete", action="store_true", help="delete them instead of only counting them")
+    parser.add_argument("--min-age-hours", type=float, default=GENERATED_IMAGE_SWEEP_MIN_AGE_SECONDS / 3600)
+    args = parser.parse_args()
+    print(sweep_generated_images(get_firestore_client(), BUCKET_URI.replace("gs://", ""), args.delete,
+                                 args.min_age_hours * 3600))
@@ -0,0 +1,74 @@
+"""Scores every play of a game and keeps the key moments, so the story prompt no longer grows with the game.
+
+A play's score adds up, with the weights below:
+    run swing: the runs it changed the run differential by,
+    lead change: whether it put a different team ahead, or tied the game,
+    leverage: how late (7th inning on) and how close the game was when it happened,
+    captivating index: MLB's own 0-100 rating of the play,
+    scoring event: whether runs scored on it.
+The top-k plays are kept with the plays around them for context, plus the first and last play.
+"""
+import logging
+
+import numpy as np
+
+from apps.backend.api.data_model.play_table import PlayTable
+from apps.backend.utils.constants import KEY_MOMENTS_TOP_K, KEY_MOMENTS_CONTEXT_PLAYS
+
+logger = logging.getLogger(__name__)
+
+RUN_SWING_WEIGHT = 1.0
+LEAD_CHANGE_WEIGHT = 3.0
+LEVERAGE_WEIGHT = 2.0
+CAPTIVATING_INDEX_WEIGHT = 2.0
+SCORING_EVENT_WEIGHT = 1.5
+LATE_INNING = 7
+
+
+def score_plays(plays: PlayTable) -> np.ndarray:
+    """The key-moment score of every play, see the module docstring."""
+    run_differential = plays.home_score.astype(np.int32) - plays.away_score
+    differential_before = np.concatenate(([0], run_differential[:-1]))
+    run_swing = np.abs(run_differential - differential_before)
+
+    lead_change = np.sign(run_differential) != np.sign(differential_before)
+
+    innings_late = np.clip(plays.inning - (LATE_INNING - 1), 0, None)
+    leverage = innings_late / (1.0 + np.abs(differential_before))
+
+    captivating_index = plays.captivating_index / 100.0
+    scoring_event = run_swing > 0
+
+    return (RUN_SWING_WEIGHT * run_swing
+            + LEAD_CHANGE_WEIGHT * lead_change
+            + LEVERAGE_WEIGHT * leverage
+            + CAPTIVATING_INDEX_WEIGHT * captivating_index
+            + SCORING_EVENT_WEIGHT * scoring_event)
+
+
+def select_key_moments(plays, top_k: int = KEY_MOMENTS_TOP_K,
+                       context: int = KEY_MOMENTS_CONTEXT_PLAYS) -> PlayTable:
+    """Keeps the top_k highest scoring plays, the context plays before and after each, and the first and last play.
+
+    Args:
+        plays: A PlayTable, or a list of play dicts as extract_play_by_play used to return.
+        top_k: The number of key moments.
+        context: The number of plays kept on each side of a key moment.
+
+    Returns:
+        The selected plays in game order, or all of them when they fit.
+    """
+    if not isinstance(plays, PlayTable):
+        plays = PlayTable.from_records(plays)
+    count = len(plays)
+    if count <= top_k * (2 * context + 1) + 2:
+        return plays
+
+    scores = score_plays(plays)
+    key_moments = np.argpartition(-scores, top_k)[:top_k]
+    selected = np.zeros(count, dtype=bool)
+    for offset in range(-context, context + 1):
+        selected[np.clip(key_moments + offset, 0, count - 1)] = True
+    selected[[0, -1]] = True
+    logger.info(f"Selected {int(selected.sum())} of {count} plays around {top_k} key moments")
+    return plays.take(selected)
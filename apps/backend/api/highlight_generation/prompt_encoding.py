@@ -0,0 +1,165 @@
+"""Compact encoding of the plays sent in the story prompt, within a token budget.
+
+The plays used to be sent as the repr of a list of dicts, every key repeated on every play. They are now a
+table: a header row, then one "|" delimited row per play, with common events abbreviated and players numbered,
+each with a legend of the ones used. When the table is over the budget, the lowest scoring plays (see
+key_moments) are left out and summed up in one line per half-inning instead.
+
+Tokens are estimated from the length of the text, which is close enough to budget a prompt without calling
+the model's tokenizer.
+"""
+import logging
+import sys
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from apps.backend.api.data_model.play_table import PlayTable
+from apps.backend.api.highlight_generation.key_moments import score_plays
+from apps.backend.utils.constants import STORY_PROMPT_PLAY_TOKEN_BUDGET, PROMPT_CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+EVENT_ABBREVIATIONS = {
+    "Single": "1B",
+    "Double": "2B",
+    "Triple": "3B",
+    "Home Run": "HR",
+    "Walk": "BB",
+    "Intent Walk": "IBB",
+    "Strikeout": "K",
+    "Strikeout Double Play": "KDP",
+    "Hit By Pitch": "HBP",
+    "Groundout": "GO",
+    "Flyout": "FO",
+    "Lineout": "LO",
+    "Pop Out": "PO",
+    "Forceout": "FRC",
+    "Fielders Choice": "FC",
+    "Fielders Choice Out": "FCO",
+    "Grounded Into DP": "GIDP",
+    "Double Play": "DP",
+    "Sac Fly": "SF",
+    "Sac Bunt": "SAC",
+    "Field Error": "E",
+    "Stolen Base 2B": "SB2",
+    "Caught Stealing 2B": "CS2",
+    "Wild Pitch": "WP",
+}
+HEADER = "inn|half|away|home|event|batter|pitcher|index|description"
+DELIMITER = "|"
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // PROMPT_CHARS_PER_TOKEN)
+
+
+def encode_plays(plays: PlayTable, omitted: Optional[PlayTable] = None) -> str:
+    """The plays as a table with the legends of the events and players it uses.
+
+    Args:
+        plays: The plays of the table, in game order.
+        omitted: Plays left out of the table, summed up per half-inning after it.
+    """
+    events = np.unique(plays.event_codes)
+    abbreviations = {code: EVENT_ABBREVIATIONS.get(plays.events.values[code], plays.events.values[code])
+                     for code in events}
+    # Players are numbered in order of appearance among the plays shown
+    player_codes = {}
+    for code in np.stack((plays.batter_codes, plays.pitcher_codes), axis=1).ravel():
+        player_codes.setdefault(code, len(player_codes) + 1)
+
+    event_legend = ", ".join(f"{abbreviations[code]}={plays.events.values[code]}" for code in events
+                             if abbreviations[code] != plays.events.values[code])
+    lines = ([f"Events: {event_legend}"] if event_legend else []) + [
+        "Players: " + ", ".join(f"P{number}={plays.players.values[code]}" for code, number in player_codes.items()),
+        HEADER,
+    ]
+    for index, (inning, is_bottom, away, home, event, batter, pitcher, captivating_index) in enumerate(zip(
+            plays.inning.tolist(), plays.is_bottom.tolist(), plays.away_score.tolist(), plays.home_score.tolist(),
+            plays.event_codes.tolist(), plays.batter_codes.tolist(), plays.pitcher_codes.tolist(),
+            plays.captivating_index.tolist())):
+        lines.append(DELIMITER.join((
+            str(inning), "B" if is_bottom else "T", str(away), str(home), abbreviations[event],
+            f"P{player_codes[batter]}", f"P{player_codes[pitcher]}", str(captivating_index),
+            plays.description[index].replace(DELIMITER, "/"))))
+    if omitted is not None and len(omitted):
+        lines.append("Plays left out: " + "; ".join(_summarize_half_innings(omitted)))
+    return "\n".join(lines)
+
+
+def fit_to_budget(plays: PlayTable, budget_tokens: int = STORY_PROMPT_PLAY_TOKEN_BUDGET) -> Tuple[str, int]:
+    """Encodes the plays, leaving out the lowest scoring ones until the table fits budget_tokens.
+
+    Returns:
+        The encoded plays and the number of plays left out.
+    """
+    text = encode_plays(plays)
+    if estimate_tokens(text) <= budget_tokens or len(plays) <= 1:
+        return text, 0
+
+    by_score = np.argsort(-score_plays(plays), kind="stable")
+    keep = len(plays)
+    while keep > 1 and estimate_tokens(text) > budget_tokens:
+        keep -= max(1, keep // 10)
+        selected = np.zeros(len(plays), dtype=bool)
+        selected[by_score[:keep]] = True
+        text = encode_plays(plays.take(selected), plays.take(~selected))
+    logger.info(f"Left {len(plays) - keep} of {len(plays)} plays out of the story prompt to fit "
+                f"{budget_tokens} tokens")
+    return text, len(plays) - keep
+
+
+def encode_story_plays(plays, budget_tokens: int = STORY_PROMPT_PLAY_TOKEN_BUDGET) -> str:
+    """The plays for provide_story_prompt, a PlayTable or a list of play dicts, within budget_tokens."""
+    if not isinstance(plays, PlayTable):
+        plays = PlayTable.from_records(plays)
+    return fit_to_budget(plays, budget_tokens)[0]
+
+
+def token_savings(all_plays, prompt: str, encoded_plays: str) -> dict:
+    """Compares a story prompt with the one the game got before, which embedded the repr of every play twice.
+
+    Args:
+        all_plays: Every play of the game.
+        prompt: The story prompt built from encoded_plays.
+        encoded_plays: The plays as encoded in prompt.
+    """
+    legacy_plays_tokens = estimate_tokens(str(all_plays))
+    tokens = estimate_tokens(prompt)
+    legacy_tokens = tokens - estimate_tokens(encoded_plays) + 2 * legacy_plays_tokens
+    return {
+        "plays": len(all_plays),
+        "legacyTokens": legacy_tokens,
+        "tokens": tokens,
+        "savedTokens": legacy_tokens - tokens,
+        "savedPercent": round(100 * (legacy_tokens - tokens) / legacy_tokens, 1) if legacy_tokens else 0.0,
+    }
+
+
+def _summarize_half_innings(plays: PlayTable) -> List[str]:
+    """One "inning+half: count plays, score away-home after them" line per half-inning."""
+    summaries = []
+    half_innings = plays.inning.astype(np.int32) * 2 + plays.is_bottom
+    for half_inning in np.unique(half_innings):
+        in_half = np.flatnonzero(half_innings == half_inning)
+        last = in_half[-1]
+        summaries.append(f"{half_inning // 2}{'B' if half_inning % 2 else 'T'}: {len(in_half)} "
+                         f"play{'s' if len(in_half) > 1 else ''}, score {plays.away_score[last]}-"
+                         f"{plays.home_score[last]} after")
+    return summaries
+
+
+if __name__ == "__main__":
+    # Prints the story prompt tokens saved per game, e.g. python -m ...prompt_encoding 775294 775300
+    from apps.backend.api.highlight_generation.key_moments import select_key_moments
+    from apps.backend.api.highlight_generation.prompt_garden import provide_story_prompt
+    from apps.backend.api.mlb_data_fetching.gumbo_processor import fetch_game_extract, extract_play_by_play
+
+    print(f"{'game':>8} {'plays':>6} {'before':>8} {'after':>8} {'saved':>8} {'saved %':>8}")
+    for game_pk in sys.argv[1:]:
+        play_by_play = extract_play_by_play(fetch_game_extract(game_pk))
+        encoded = encode_story_plays(select_key_moments(play_by_play))
+        report = token_savings(play_by_play, provide_story_prompt(encoded), encoded)
+        print(f"{game_pk:>8} {report['plays']:>6} {report['legacyTokens']:>8} {report['tokens']:>8} "
+              f"{report['savedTokens']:>8} {report['savedPercent']:>8}")
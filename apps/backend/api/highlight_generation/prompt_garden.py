@@ -1,6 +1,9 @@
 def provide_story_prompt(text) -> str:
     return f"""
-        Given this JSON of a completed baseball game {text}, tell the story of the game 
+        Given this table of the plays of a completed baseball game, one play per row after the legends and
+        the header row:
+        {text}
+        tell the story of the game 
         in a structured three-act format that is captivating for children. Focus only on information directly relevant to 
         the plays described, without inventing or inferring events not explicitly represented in the data. Assume the 
         reader has a basic knowledge of the game and its rules. Incorporate the following: Three-Act Structure: Opening 
@@ -10,7 +13,7 @@ def provide_story_prompt(text) -> str:
         momentum between the teams. Act 3 (Resolution): Conclude with the final dramatic moments of the game, 
         including any climactic plays and the outcome. End with a sense of closure or excitement about the game's 
         conclusion. Closing Shot (Act 3 final scene): wrap up the story for the viewer Each act should consist of 3-5 
-        scenes depending on the {text}
+        scenes depending on the plays
         The final story should be 11-17 scenes with opening and closing shots
         Language Requirements:The story should be provided in English, Spanish, and Japanese. Each scene must include captions and audio URLs for all three languages.
         Output the story in JSON format as an object of scenes following this schema:
@@ -0,0 +1,153 @@
+"""Local similarity index of the prompts of generated images, to reuse an image for a near-identical prompt.
+
+Scene prompts repeat across games ("a pitcher winds up under stadium lights wearing ..."), and so do the
+matchup prompts of a series. Each prompt is normalized and turned into a hashed vector of its word 1- and
+2-grams, L2 normalized, so the dot product of two vectors is their cosine similarity. Vectors are rows of a
+memory-mapped float32 matrix on local disk, written round-robin once it is full, and the image URL, aspect
+ratio and teams of each row are appended to a JSON-lines file next to it. A search is one matrix-vector product.
+
+An image is only reused for the same aspect ratio and the same teams, whose uniforms it may show. Processes
+sharing the directory add rows under an exclusive file lock and pick up each other's rows on their next search.
+"""
+import fcntl
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from apps.backend.utils.constants import PROMPT_INDEX_DIR, PROMPT_INDEX_DIMENSIONS, PROMPT_INDEX_MAX_ENTRIES, \
+    IMAGE_REUSE_SIMILARITY_THRESHOLD
+from apps.backend.utils.log_util import logger
+
+VECTORS_FILE = "vectors.f32"
+ENTRIES_FILE = "entries.jsonl"
+SEARCH_CANDIDATES = 16
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+
+def prompt_vector(prompt: str, dimensions: int = PROMPT_INDEX_DIMENSIONS) -> np.ndarray:
+    """The L2-normalized, signed hashed counts of the word 1- and 2-grams of the normalized prompt."""
+    words = normalize_prompt(prompt).split()
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for gram in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _teams_key(teams: Iterable[str]) -> List[str]:
+    return sorted(str(team) for team in teams if team)
+
+
+class PromptSimilarityIndex:
+    """See the module docstring.
+
+    Args:
+        directory: Where the matrix and the entries are stored.
+        dimensions: The length of the prompt vectors.
+        max_entries: The rows of the matrix, the oldest row is replaced once they are all used.
+    """
+
+    def __init__(self, directory: str = PROMPT_INDEX_DIR, dimensions: int = PROMPT_INDEX_DIMENSIONS,
+                 max_entries: int = PROMPT_INDEX_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._vectors = None
+        self._entries = [None] * max_entries
+        self._next_row = 0
+        self._entries_offset = 0
+        self._lock = threading.Lock()
+
+    def find_similar(self, prompt: str, aspect_ratio: str, teams: Iterable[str] = (),
+                     threshold: float = IMAGE_REUSE_SIMILARITY_THRESHOLD) -> Optional[dict]:
+        """The most similar indexed image of the same aspect ratio and teams, if its similarity reaches threshold.
+
+        Returns:
+            The entry ({"url", "aspectRatio", "teams", "prompt", "similarity"}), or None.
+        """
+        if threshold > 1:
+            return None
+        query = prompt_vector(prompt, self.dimensions)
+        teams = _teams_key(teams)
+        with self._lock:
+            if not self._open():
+                return None
+            self._read_new_entries()
+            similarities = self._vectors @ query
+            candidates = np.argsort(-similarities)[:SEARCH_CANDIDATES]
+            for row in candidates:
+                if similarities[row] < threshold:
+                    break
+                entry = self._entries[row]
+                if entry and entry["aspectRatio"] == aspect_ratio and entry["teams"] == teams:
+                    return {**entry, "similarity": round(float(similarities[row]), 4)}
+        return None
+
+    def add(self, prompt: str, aspect_ratio: str, teams: Iterable[str], url: str):
+        """Indexes the image generated for prompt."""
+        vector = prompt_vector(prompt, self.dimensions)
+        entry = {"url": url, "aspectRatio": aspect_ratio, "teams": _teams_key(teams), "prompt": prompt[:200]}
+        try:
+            with self._lock:
+                if not self._open(create=True):
+                    return
+                with open(self.directory / ENTRIES_FILE, "a+", encoding="utf-8") as entries_file:
+                    fcntl.flock(entries_file, fcntl.LOCK_EX)
+                    try:
+                        self._read_new_entries()
+                        row = self._next_row
+                        self._vectors[row] = vector
+                        self._vectors.flush()
+                        entries_file.write(json.dumps({"row": row, **entry}) + "\n")
+                        entries_file.flush()
+                    finally:
+                        fcntl.flock(entries_file, fcntl.LOCK_UN)
+                self._read_new_entries()
+        except OSError as e:
+            logger.warning(f"Could not index the prompt of {url}: {e}")
+
+    def _open(self, create: bool = False) -> bool:
+        """Maps the matrix, creating it (zero rows never match) when create is set."""
+        if self._vectors is not None:
+            return True
+        path = self.directory / VECTORS_FILE
+        if not path.exists():
+            if not create:
+                return False
+            self.directory.mkdir(parents=True, exist_ok=True)
+        size = self.max_entries * self.dimensions * np.dtype(np.float32).itemsize
+        # Extended in place, never truncated, another process may be creating it as well
+        with open(path, "ab") as vectors_file:
+            if vectors_file.tell() < size:
+                vectors_file.truncate(size)
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(self.max_entries, self.dimensions))
+        return True
+
+    def _read_new_entries(self):
+        """Reads the entries appended since the last read, by this or another process."""
+        path = self.directory / ENTRIES_FILE
+        if not path.exists():
+            return
+        with open(path, "rb") as entries_file:
+            entries_file.seek(self._entries_offset)
+            for line in iter(entries_file.readline, b""):
+                if not line.endswith(b"\n"):
+                    # Still being written
+                    break
+                self._entries_offset += len(line)
+                entry = json.loads(line)
+                row = entry.pop("row")
+                self._entries[row] = entry
+                self._next_row = (row + 1) % self.max_entries
+
+
+prompt_index = PromptSimilarityIndex()
@@ -0,0 +1,113 @@
+"""Generates the images and audio of a storyboard's scenes concurrently.
+
+Every scene needs one Imagen image and one TTS clip per language, on top of the story image, 60+ remote calls
+for a full storyboard. With TTS_BATCH_BY_ACT the clips of an act are synthesized in one request per language
+and split at SSML marks, 9 TTS requests for a three-act storyboard instead of one per scene and language. They
+all run at once on two executors, one per service, whose sizes cap the concurrent calls to each service across
+every generation of the process. Results are set on the scenes in scene order once every job is done, and a
+failed job only leaves its own asset empty (or the placeholder image).
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List
+
+from apps.backend.api.data_model.scene import Scene
+from apps.backend.api.data_model.storyboard import Storyboard
+from apps.backend.api.highlight_generation.image_generator import upload_story_list_image_to_gcs, \
+    upload_image_to_gcs, get_placeholder_image_url
+from apps.backend.api.highlight_generation.speech_generator import synthesize_highlight_from_ssml, \
+    synthesize_act_from_ssml
+from apps.backend.utils.constants import SCENE_IMAGE_CONCURRENCY, SCENE_AUDIO_CONCURRENCY, TTS_BATCH_BY_ACT
+
+logger = logging.getLogger(__name__)
+
+AUDIO_LANGUAGES = ("en", "es", "ja")
+
+image_executor = ThreadPoolExecutor(max_workers=SCENE_IMAGE_CONCURRENCY, thread_name_prefix="scene-image")
+audio_executor = ThreadPoolExecutor(max_workers=SCENE_AUDIO_CONCURRENCY, thread_name_prefix="scene-audio")
+
+
+def add_scene_assets(storyboard: Storyboard, game_pk, teams: Iterable[str] = ()) -> List[str]:
+    """Generates and uploads the story image, and the image and audio of every scene, setting their URLs in place.
+
+    Args:
+        storyboard: The storyboard with its Imagen prompts and captions.
+        game_pk: The game key.
+        teams: The teams of the game, images of similar prompts are only reused for the same teams.
+
+    Returns:
+        The assets that failed, e.g. "scene 3 audioUrl_ja", which are left empty or set to the placeholder image.
+    """
+    scenes = storyboard.scenes or []
+    story_image = image_executor.submit(upload_story_list_image_to_gcs, storyboard, game_pk, teams)
+    jobs = []
+    for scene in scenes:
+        jobs.append((scene, "imageUrl", image_executor.submit(
+            upload_image_to_gcs, prompt=scene.imagenPrompt, game_pk=game_pk, scene_number=scene.sceneNumber,
+            teams=teams)))
+    act_jobs = []
+    for act_scenes in (_scenes_by_act(scenes) if TTS_BATCH_BY_ACT else [[scene] for scene in scenes]):
+        for lang in AUDIO_LANGUAGES:
+            captioned = [scene for scene in act_scenes if getattr(scene, f"caption_{lang}")]
+            if len(captioned) > 1 and len({scene.sceneNumber for scene in captioned}) == len(captioned):
+                captions = {scene.sceneNumber: getattr(scene, f"caption_{lang}") for scene in captioned}
+                act_jobs.append((captioned, lang, audio_executor.submit(
+                    synthesize_act_from_ssml, captions, lang, captioned[0].actNumber)))
+            else:
+                jobs.extend(_scene_audio_job(scene, lang) for scene in captioned)
+    logger.info(f"Generating {len(jobs) + len(act_jobs) + 1} asset batches for {len(scenes)} scenes of game "
+                f"{game_pk}...")
+
+    # An act whose batch failed falls back to one request per scene
+    for captioned, lang, future in act_jobs:
+        try:
+            urls = future.result()
+        except Exception as e:
+            logger.warning(f"Batched {lang} audio of act {captioned[0].actNumber} failed, synthesizing its "
+                           f"scenes one by one: {str(e)}")
+            jobs.extend(_scene_audio_job(scene, lang) for scene in captioned)
+            continue
+        for scene in captioned:
+            jobs.append((scene, f"audioUrl_{lang}", _done(urls.get(scene.sceneNumber))))
+
+    failed = []
+    storyboard.storyImageUrl = _asset(story_image, "story image", get_placeholder_image_url(), failed)
+    for scene, attribute, future in jobs:
+        fallback = get_placeholder_image_url() if attribute == "imageUrl" else ""
+        setattr(scene, attribute, _asset(future, f"scene {scene.sceneNumber} {attribute}", fallback, failed))
+
+    logger.info(f"Generated the assets of game {game_pk}, {len(failed)} failed: {failed}")
+    return failed
+
+
+def _scenes_by_act(scenes: List[Scene]) -> List[List[Scene]]:
+    """The scenes grouped by act, in scene order."""
+    acts = {}
+    for scene in scenes:
+        acts.setdefault(scene.actNumber, []).append(scene)
+    return list(acts.values())
+
+
+def _scene_audio_job(scene: Scene, lang: str) -> tuple:
+    return (scene, f"audioUrl_{lang}", audio_executor.submit(
+        synthesize_highlight_from_ssml, caption=getattr(scene, f"caption_{lang}"), language_code=lang,
+        act_number=scene.actNumber, scene_number=scene.sceneNumber))
+
+
+def _done(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _asset(future: Future, name: str, fallback: str, failed: List[str]) -> str:
+    """The URL a job produced, or fallback (recorded in failed) when it raised or produced nothing."""
+    try:
+        url = future.result()
+    except Exception as e:
+        logger.error(f"Failed to generate {name}: {str(e)}", exc_info=True)
+        url = None
+    if not url or url == fallback:
+        failed.append(name)
+        return fallback
+    return url
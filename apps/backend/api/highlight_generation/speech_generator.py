@@ -1,11 +1,50 @@
+import functools
 import logging
-from google.cloud import texttospeech
+from typing import Dict, List, Sequence
+from xml.sax.saxutils import quoteattr
 
 from apps.backend.config import BUCKET_URI
+from apps.backend.utils.clients import get_tts_client
+from apps.backend.utils.constants import TTS_MAX_SSML_BYTES
 from apps.backend.utils.gcs_utils import upload_blob_from_stream
+from apps.backend.utils.mp3_utils import split_mp3
+from apps.backend.utils.rate_limiter import rate_limiter
 
 logger = logging.getLogger(__name__)
 
+# (language code, voice name) per caption language
+VOICES = {
+    "en": ("en-US", "en-US-Neural2-D"),
+    "es": ("es-US", "es-US-Neural2-B"),
+    "ja": ("ja-JP", "ja-JP-Neural2-C"),
+}
+SPEAKING_RATE = 1.15
+PITCH = -1.5
+
+
+@functools.lru_cache(maxsize=None)
+def _voice_config(language_code: str):
+    """The voice and audio config of a caption language, built once per process."""
+    if language_code not in VOICES:
+        error_msg = f"Unsupported language code: {language_code}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    from google.cloud import texttospeech_v1beta1 as texttospeech
+    locale, voice_name = VOICES[language_code]
+    return (
+        texttospeech.VoiceSelectionParams(
+            language_code=locale,
+            name=voice_name
+        ),
+        texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3,
+            speaking_rate=SPEAKING_RATE,
+            pitch=PITCH
+        )
+    )
+
+
 def synthesize_highlight_from_ssml(caption: str, language_code: str, act_number: int, scene_number: int) -> str:
     """
     Synthesizes speech from the input string of ssml and outputs the url of the storage location.
@@ -14,75 +53,26 @@ def synthesize_highlight_from_ssml(caption: str, language_code: str, act_number:
        https://www.w3.org/TR/speech-synthesis/
     """
     logger.debug(f"Synthesizing speech for language {language_code}, scene {scene_number}")
-    
-    # Configuration mapping with proper enum values
-    voice_configs = {
-        "en": (
-            texttospeech.VoiceSelectionParams(
-                language_code="en-US",
-                name="en-US-Neural2-D"
-            ),
-            texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=1.15,
-                pitch=-1.5
-            )
-        ),
-        "es": (
-            texttospeech.VoiceSelectionParams(
-                language_code="es-US",
-                name="es-US-Neural2-B"
-            ),
-            texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=1.15,
-                pitch=-1.5
-            )
-        ),
-        "ja": (
-            texttospeech.VoiceSelectionParams(
-                language_code="ja-JP",
-                name="ja-JP-Neural2-C"
-            ),
-            texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=1.15,
-                pitch=-1.5
-            )
-        )
-    }
-
-    if language_code not in voice_configs:
-        error_msg = f"Unsupported language code: {language_code}"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+    from google.cloud import texttospeech_v1beta1 as texttospeech
 
+    voice, audio_config = _voice_config(language_code)
     try:
         # Prepare SSML input
         ssml = f"<speak>{caption}</speak>"
         input_text = texttospeech.SynthesisInput(ssml=ssml)
-        
-        # Get voice and audio config for the language
-        voice, audio_config = voice_configs[language_code]
-        
+
         # Generate speech
         logger.debug(f"Generating speech with {language_code} voice")
-        tts_client = texttospeech.TextToSpeechClient()
-        response = tts_client.synthesize_speech(
+        response = rate_limiter.call(
+            f"tts.{voice.name}",
+            get_tts_client().synthesize_speech,
             input=input_text,
             voice=voice,
             audio_config=audio_config
         )
-        
-        # Upload to storage
+
         logger.debug(f"Uploading audio file for scene {scene_number}")
-        bucket_name = BUCKET_URI.replace('gs://', '')
-        blob_url = upload_blob_from_stream(
-            bucket_name=bucket_name,
-            destination_blob_name=_build_output_file_name(act_number, scene_number, language_code),
-            content=response.audio_content
-        )
-        
+        blob_url = _upload_audio(response.audio_content, act_number, scene_number, language_code)
         logger.info(f"Successfully generated and uploaded audio for {language_code}, scene {scene_number}")
         return blob_url
 
@@ -90,6 +80,101 @@ def synthesize_highlight_from_ssml(caption: str, language_code: str, act_number:
         logger.error(f"Failed to synthesize speech for {language_code}, scene {scene_number}: {str(e)}", exc_info=True)
         raise
 
+
+def synthesize_act_from_ssml(captions: Dict[int, str], language_code: str, act_number: int) -> Dict[int, str]:
+    """
+    Synthesizes the captions of an act's scenes in one request per batch, and outputs the url of each scene's clip.
+
+    The captions are sent as one SSML document with a <mark> before each scene. The response's timepoints give
+    the time of each mark, where the returned MP3 is split into the scenes' clips. Captions are batched in scene
+    order up to TTS_MAX_SSML_BYTES, the request limit.
+
+    Args:
+        captions: The caption of each scene number, in scene order.
+        language_code: The caption language, e.g. "en".
+        act_number: The act of the scenes.
+
+    Returns:
+        The url of the clip of each scene number.
+    """
+    urls = {}
+    for batch in _batch_captions(captions):
+        urls.update(_synthesize_batch(batch, language_code, act_number))
+    return urls
+
+
+def _batch_captions(captions: Dict[int, str]) -> List[Dict[int, str]]:
+    batches = [{}]
+    size = len("<speak></speak>")
+    for scene_number, caption in captions.items():
+        scene_size = len(_scene_ssml(scene_number, caption).encode("utf-8"))
+        if batches[-1] and size + scene_size > TTS_MAX_SSML_BYTES:
+            batches.append({})
+            size = len("<speak></speak>")
+        batches[-1][scene_number] = caption
+        size += scene_size
+    return batches
+
+
+def _scene_ssml(scene_number: int, caption: str) -> str:
+    return f"<mark name={quoteattr(_mark_name(scene_number))}/>{caption}"
+
+
+def _mark_name(scene_number: int) -> str:
+    return f"scene-{scene_number}"
+
+
+def _synthesize_batch(captions: Dict[int, str], language_code: str, act_number: int) -> Dict[int, str]:
+    logger.debug(f"Synthesizing speech for language {language_code}, act {act_number}, scenes {list(captions)}")
+    from google.cloud import texttospeech_v1beta1 as texttospeech
+
+    voice, audio_config = _voice_config(language_code)
+    ssml = "<speak>" + "".join(_scene_ssml(scene_number, caption)
+                               for scene_number, caption in captions.items()) + "</speak>"
+    response = rate_limiter.call(
+        f"tts.{voice.name}",
+        get_tts_client().synthesize_speech,
+        request=texttospeech.SynthesizeSpeechRequest(
+            input=texttospeech.SynthesisInput(ssml=ssml),
+            voice=voice,
+            audio_config=audio_config,
+            enable_time_pointing=[texttospeech.SynthesizeSpeechRequest.TimepointType.SSML_MARK],
+        )
+    )
+
+    mark_seconds = {timepoint.mark_name: timepoint.time_seconds for timepoint in response.timepoints}
+    scene_numbers = list(captions)
+    missing = [scene_number for scene_number in scene_numbers[1:] if _mark_name(scene_number) not in mark_seconds]
+    if missing:
+        raise ValueError(f"No timepoints for scenes {missing} of act {act_number} in {language_code}")
+    clips = split_mp3(response.audio_content, _ascending([mark_seconds[_mark_name(scene_number)]
+                                                          for scene_number in scene_numbers[1:]]))
+
+    urls = {}
+    for scene_number, clip in zip(scene_numbers, clips):
+        if not clip:
+            raise ValueError(f"Empty clip for scene {scene_number} of act {act_number} in {language_code}")
+        urls[scene_number] = _upload_audio(clip, act_number, scene_number, language_code)
+    logger.info(f"Successfully generated and uploaded audio for {language_code}, act {act_number}, "
+                f"{len(urls)} scenes in one request")
+    return urls
+
+
+def _ascending(seconds: Sequence[float]) -> List[float]:
+    if any(later < earlier for earlier, later in zip(seconds, seconds[1:])):
+        raise ValueError(f"Mark timepoints are not in scene order: {list(seconds)}")
+    return list(seconds)
+
+
+def _upload_audio(audio_content: bytes, act_number: int, scene_number: int, language_code: str) -> str:
+    bucket_name = BUCKET_URI.replace('gs://', '')
+    return upload_blob_from_stream(
+        bucket_name=bucket_name,
+        destination_blob_name=_build_output_file_name(act_number, scene_number, language_code),
+        content=audio_content
+    )
+
+
 def _build_output_file_name(act_number: int, scene_number: int, language_code: str) -> str:
     """Build the output file name for the audio file."""
     return f"sluggers_tts_{act_number}{scene_number}{language_code}.mp3"
@@ -0,0 +1,84 @@
+from typing import Dict, Optional, Tuple
+
+from apps.backend.api.highlight_store.storyboard_store import delete_unused_scenes, \
+    to_document as storyboard_to_document
+from apps.backend.api.highlight_store.team_feed import HIGHLIGHTS_COLLECTION
+from apps.backend.api.highlight_store.team_timeline import write_highlights
+from apps.backend.utils.log_util import logger
+
+MAX_BATCH_SIZE = 500
+# A transaction holds at most 500 writes, this leaves room for the timelines of every team
+MAX_CREATES_PER_COMMIT = 200
+# Per-item statuses reported by POST /highlights:batch
+CREATED = "created"
+CONFLICT = "conflict"
+INVALID = "invalid"
+FAILED = "failed"
+
+
+def create_highlights_if_absent(db, highlights: Dict[str, dict]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """Creates highlight documents together with their teams' timelines, never overwriting an existing document.
+
+    The batch is read with one get_all per chunk of MAX_CREATES_PER_COMMIT games, and only the absent games
+    get their storyboard converted (large scenes offloaded to GCS) and created. Each chunk is created in one
+    transaction with the timelines, so a highlight and its feed entries are written together or not at all.
+    Scenes offloaded for a game that turns out to exist, or whose commit failed, are deleted again.
+
+    Args:
+        db: The Firestore client.
+        highlights: The validated highlight documents keyed by gamePk, storyboards still in their request form.
+
+    Returns:
+        The (status, error) of every gamePk that was not created, a gamePk missing from it was created.
+    """
+    failures = {}
+    game_pks = list(highlights)
+    for chunk_start in range(0, len(game_pks), MAX_CREATES_PER_COMMIT):
+        chunk = {game_pk_str: highlights[game_pk_str]
+                 for game_pk_str in game_pks[chunk_start:chunk_start + MAX_CREATES_PER_COMMIT]}
+        failures.update(_create_chunk(db, chunk))
+
+    logger.info(f"Bulk created {len(highlights) - len(failures)} of {len(highlights)} highlights.")
+    return failures
+
+
+def _create_chunk(db, highlights: Dict[str, dict]) -> Dict[str, Tuple[str, Optional[str]]]:
+    failures = {}
+    collection_ref = db.collection(HIGHLIGHTS_COLLECTION)
+    existing = {snapshot.id for snapshot in db.get_all([collection_ref.document(game_pk_str)
+                                                        for game_pk_str in highlights]) if snapshot.exists}
+
+    to_create = {}
+    for game_pk_str, data in highlights.items():
+        if game_pk_str in existing:
+            failures[game_pk_str] = (CONFLICT, "Highlight already exists.")
+            continue
+        try:
+            # Large scenes are moved to a compressed GCS object to keep the document well under 1 MiB
+            to_create[game_pk_str] = {**data, "storyboard": storyboard_to_document(data["storyboard"], game_pk_str)}
+        except ValueError as e:
+            failures[game_pk_str] = (INVALID, str(e))
+        except Exception as e:
+            failures[game_pk_str] = (FAILED, f"Could not store the scenes: {e}")
+    if not to_create:
+        return failures
+
+    def build_create(data):
+        return lambda stored: None if stored else ("create", data)
+
+    try:
+        results = write_highlights(db, {game_pk_str: build_create(data) for game_pk_str, data in to_create.items()})
+    except Exception as e:
+        logger.error(f"Error creating highlights {list(to_create)}: {e}")
+        for game_pk_str, data in to_create.items():
+            failures[game_pk_str] = (FAILED, str(e))
+            delete_unused_scenes(data, None)
+        return failures
+
+    for game_pk_str, (stored, written) in results.items():
+        if written is None:
+            # Created by someone else since the get_all
+            failures[game_pk_str] = (CONFLICT, "Highlight already exists.")
+            delete_unused_scenes(to_create[game_pk_str], stored)
+    return failures
+
@@ -0,0 +1,132 @@
+import dataclasses
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from apps.backend.utils.constants import SCENES_OFFLOAD_BYTES
+from apps.backend.utils.gcs_utils import upload_bytes, download_bytes, delete_blob
+from apps.backend.utils.log_util import logger
+
+SCENES_REF_FIELD = "scenesRef"
+SCENES_BLOB_PREFIX = "storyboards"
+
+
+def to_storyboard_dict(storyboard: Any) -> Optional[dict]:
+    """Normalizes a Storyboard, a dict or a legacy JSON string storyboard to a plain dict."""
+    if storyboard is None:
+        return None
+    if dataclasses.is_dataclass(storyboard):
+        return dataclasses.asdict(storyboard)
+    if isinstance(storyboard, str):
+        try:
+            storyboard = json.loads(storyboard)
+        except ValueError:
+            return None
+    return storyboard if isinstance(storyboard, dict) else None
+
+
+def to_document(storyboard: Any, game_pk: str, bucket_name: Optional[str] = None) -> dict:
+    """Builds the Firestore representation of a storyboard: a native map, with large scenes moved to GCS.
+
+    Args:
+        storyboard: A Storyboard, a dict or a JSON string.
+        game_pk: The game key, used to name the offloaded scenes object.
+        bucket_name: The bucket for offloaded scenes, defaults to the configured bucket.
+
+    Returns:
+        The storyboard map. When its scenes serialize larger than SCENES_OFFLOAD_BYTES they are replaced
+        by a scenesRef pointer to a gzipped JSON object.
+    """
+    document = to_storyboard_dict(storyboard)
+    if document is None:
+        raise ValueError(f"Storyboard for game {game_pk} is not an object.")
+
+    scenes = document.get("scenes")
+    if not scenes:
+        return document
+    scenes_json = json.dumps(scenes, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(scenes_json) <= SCENES_OFFLOAD_BYTES:
+        return document
+
+    if bucket_name is None:
+        from apps.backend.config import BUCKET_URI
+        bucket_name = BUCKET_URI.replace("gs://", "")
+    compressed = gzip.compress(scenes_json, mtime=0)
+    # Content-addressed, so a rejected write never replaces the scenes an existing document points to
+    blob_name = f"{SCENES_BLOB_PREFIX}/{game_pk}/scenes-{hashlib.sha256(scenes_json).hexdigest()[:16]}.json.gz"
+    uri = upload_bytes(bucket_name, blob_name, compressed, "application/gzip")
+    logger.info(f"Offloaded {len(scenes)} scenes of game {game_pk} ({len(scenes_json)} bytes) to {uri}.")
+
+    document = {key: value for key, value in document.items() if key != "scenes"}
+    document[SCENES_REF_FIELD] = {"uri": uri, "sceneCount": len(scenes), "bytes": len(scenes_json)}
+    return document
+
+
+def delete_unused_scenes(highlight: dict, stored: Optional[dict]):
+    """Deletes the scenes offloaded for a highlight that was not written, unless the stored one uses them too."""
+    uri = _scenes_uri(highlight)
+    if uri is None or uri == _scenes_uri(stored):
+        return
+    try:
+        delete_blob(uri)
+    except Exception as e:
+        logger.warning(f"Could not delete the unused scenes {uri}: {e}")
+
+
+def _scenes_uri(highlight: Optional[dict]) -> Optional[str]:
+    storyboard = (highlight or {}).get("storyboard")
+    if not isinstance(storyboard, dict):
+        return None
+    return (storyboard.get(SCENES_REF_FIELD) or {}).get("uri")
+
+
+def rehydrate(storyboard: Any) -> Optional[dict]:
+    """Returns the storyboard dict with offloaded scenes read back from GCS."""
+    document = to_storyboard_dict(storyboard)
+    if document is None or SCENES_REF_FIELD not in document or "scenes" in document:
+        return document
+    scenes_ref = document.pop(SCENES_REF_FIELD)
+    document["scenes"] = json.loads(gzip.decompress(download_bytes(scenes_ref["uri"])))
+    return document
+
+
+def normalize_highlight(highlight: dict) -> dict:
+    """Turns a legacy JSON string storyboard into a dict so the highlight is not dropped from feeds.
+
+    A gamePk stored as a number is read as the string every other writer stores, like the timelines do.
+    """
+    if isinstance(highlight.get("gamePk"), int):
+        highlight["gamePk"] = str(highlight["gamePk"])
+    if isinstance(highlight.get("storyboard"), str):
+        storyboard = to_storyboard_dict(highlight["storyboard"])
+        if storyboard is not None:
+            highlight["storyboard"] = storyboard
+    return highlight
+
+
+def migrate_legacy_storyboards(db, collection: str = "highlights") -> int:
+    """Rewrites JSON string storyboards as native maps (offloading large scenes) and returns how many it rewrote."""
+    migrated = 0
+    for snapshot in db.collection(collection).stream():
+        storyboard = (snapshot.to_dict() or {}).get("storyboard")
+        if not isinstance(storyboard, str):
+            continue
+        try:
+            snapshot.reference.update({"storyboard": to_document(storyboard, snapshot.id)})
+            migrated += 1
+        except ValueError as e:
+            logger.error(f"Skipping storyboard of game {snapshot.id}: {e}")
+    logger.info(f"Migrated {migrated} legacy storyboards.")
+    return migrated
+
+
+if __name__ == "__main__":
+    from apps.backend.api.highlight_store.team_timeline import rebuild_team_timeline
+    from apps.backend.utils.clients import get_firestore_client
+    from apps.backend.utils.constants import TEAMS
+
+    client = get_firestore_client()
+    if migrate_legacy_storyboards(client):
+        for team in TEAMS:
+            rebuild_team_timeline(client, team["teamId"])
@@ -0,0 +1,242 @@
+import asyncio
+import base64
+import heapq
+import json
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+from google.cloud import firestore
+
+from apps.backend.api.highlight_store.storyboard_store import SCENES_REF_FIELD, normalize_highlight, rehydrate
+from apps.backend.utils.constants import ISO_FORMAT
+
+HIGHLIGHTS_COLLECTION = "highlights"
+MAX_PAGE_SIZE = 100
+# Fields a list screen needs - everything but the scenes
+LIST_VIEW_FIELDS = ["gamePk", "gameDate", "storyTitle", "teaserSummary", "storyImageUrl"]
+TOP_LEVEL_FIELDS = {"gamePk", "gameDate", "homeTeam", "awayTeam", "status", "createdAt", "updatedAt"}
+STORYBOARD_FIELDS = {"storyTitle", "teaserSummary", "storyImageUrl", "storyImagenPrompt", "scenes"}
+# Always read so results can be ordered and paged, even when the caller did not ask for them
+CURSOR_FIELDS = ["gameDate", "gamePk"]
+TEAM_SIDES = ("homeTeam", "awayTeam")
+
+
+class InvalidFeedRequest(ValueError):
+    """Raised when the limit, cursor or fields parameters of a feed request are malformed."""
+
+
+def parse_limit(limit_param: Optional[str]) -> Optional[int]:
+    if limit_param is None:
+        return None
+    try:
+        limit = int(limit_param)
+    except ValueError:
+        raise InvalidFeedRequest("'limit' must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidFeedRequest(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+def parse_fields(fields_param: Optional[str]) -> Optional[List[str]]:
+    """Parses a comma separated fields= projection, e.g. "gamePk,gameDate,storyTitle"."""
+    if not fields_param:
+        return None
+    fields = sorted({field.strip() for field in fields_param.split(",") if field.strip()})
+    unknown_fields = [field for field in fields if field not in TOP_LEVEL_FIELDS | STORYBOARD_FIELDS]
+    if unknown_fields:
+        raise InvalidFeedRequest(f"Unknown fields: {', '.join(unknown_fields)}")
+    return fields
+
+
+def encode_cursor(highlight: dict) -> str:
+    """Builds the opaque cursor pointing just after the given highlight."""
+    game_date = highlight["gameDate"]
+    if isinstance(game_date, datetime):
+        game_date = game_date.isoformat()
+    payload = json.dumps({"gameDate": game_date, "gamePk": highlight["gamePk"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return {"gameDate": _game_datetime(payload["gameDate"]), "gamePk": str(payload["gamePk"])}
+    except (ValueError, KeyError, TypeError):
+        raise InvalidFeedRequest("'cursor' is not a valid feed cursor.")
+
+
+def to_field_paths(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Maps feed fields to the Firestore field paths pushed down to select()."""
+    if fields is None:
+        return None
+    field_paths = set(CURSOR_FIELDS)
+    storyboard_fields = [field for field in fields if field in STORYBOARD_FIELDS]
+    for field in fields:
+        field_paths.add(f"storyboard.{field}" if field in STORYBOARD_FIELDS else field)
+    if "scenes" in fields:
+        # Large scenes live in GCS behind this pointer
+        field_paths.add(f"storyboard.{SCENES_REF_FIELD}")
+    if not storyboard_fields:
+        # Needed to tell finished highlights from upcoming games, stripped again in project()
+        field_paths.add("storyboard.storyTitle")
+    return sorted(field_paths)
+
+
+def project(highlight: dict, fields: Optional[List[str]]) -> dict:
+    """Drops the helper fields that were read only for ordering and filtering."""
+    if fields is None:
+        return highlight
+    projected = {field: highlight[field] for field in fields if field in TOP_LEVEL_FIELDS and field in highlight}
+    storyboard_fields = [field for field in fields if field in STORYBOARD_FIELDS]
+    if storyboard_fields:
+        storyboard = highlight["storyboard"]
+        projected["storyboard"] = {field: storyboard[field] for field in storyboard_fields if field in storyboard}
+    return projected
+
+
+def is_feed_highlight(highlight: dict) -> bool:
+    """Only games with a generated storyboard belong in a feed, upcoming games are skipped."""
+    return bool(highlight.get("gamePk")) and isinstance(highlight.get("storyboard"), dict)
+
+
+def build_team_query(collection_ref, side_field: str, team_id: int, field_paths: Optional[List[str]] = None,
+                     start_after=None, limit: Optional[int] = None):
+    """Builds the ordered, projected and limited query for one side (home or away) of a team's games.
+
+    Works for both the sync and the async Firestore collection references.
+    """
+    query = (collection_ref.where(side_field, "==", team_id)
+             .order_by("gameDate", direction=firestore.Query.DESCENDING)
+             .order_by("gamePk", direction=firestore.Query.DESCENDING))
+    if field_paths:
+        query = query.select(field_paths)
+    if start_after:
+        query = query.start_after(start_after)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def _stream_side(collection_ref, side_field, team_id, field_paths, cursor, page_size) -> Iterator[dict]:
+    """Yields one side's feed highlights newest first, fetching server-side pages of page_size on demand."""
+    start_after = cursor
+    while True:
+        snapshots = list(build_team_query(collection_ref, side_field, team_id, field_paths, start_after,
+                                          page_size).stream())
+        for snapshot in snapshots:
+            highlight = normalize_highlight(snapshot.to_dict())
+            if is_feed_highlight(highlight):
+                yield highlight
+        if not page_size or len(snapshots) < page_size:
+            return
+        start_after = snapshots[-1]
+
+
+def merge_sides(home: Iterator[dict], away: Iterator[dict]) -> Iterator[dict]:
+    """Merges the already ordered home and away streams into one newest-first stream."""
+    seen = set()
+    for highlight in heapq.merge(home, away, key=sort_key, reverse=True):
+        if highlight["gamePk"] not in seen:
+            seen.add(highlight["gamePk"])
+            yield highlight
+
+
+def fetch_team_feed(db, team_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                    fields: Optional[List[str]] = None) -> dict:
+    """Reads one page of a team's highlight feed, newest game first.
+
+    Args:
+        db: The Firestore client.
+        team_id: The MLB team id.
+        limit: The page size, or None for every highlight the team has.
+        cursor: The opaque cursor returned as nextCursor by the previous page.
+        fields: The fields to return, or None for full highlights.
+
+    Returns:
+        A dict with the highlights and, when paging, the nextCursor (None on the last page).
+    """
+    collection_ref = db.collection(HIGHLIGHTS_COLLECTION)
+    field_paths = to_field_paths(fields)
+    start_after = decode_cursor(cursor)
+    # One extra row tells us whether there is another page
+    page_size = limit + 1 if limit else None
+    sides = [_stream_side(collection_ref, side, team_id, field_paths, start_after, page_size) for side in TEAM_SIDES]
+
+    highlights = []
+    for highlight in merge_sides(*sides):
+        highlights.append(highlight)
+        if page_size and len(highlights) == page_size:
+            break
+
+    rehydrate_scenes(highlights[:limit] if limit else highlights, fields)
+    return build_feed_page(highlights, limit, fields)
+
+
+async def fetch_team_feed_async(db, team_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                                fields: Optional[List[str]] = None) -> dict:
+    """The AsyncClient counterpart of fetch_team_feed, reading the home and away sides concurrently."""
+    collection_ref = db.collection(HIGHLIGHTS_COLLECTION)
+    field_paths = to_field_paths(fields)
+    start_after = decode_cursor(cursor)
+    page_size = limit + 1 if limit else None
+    home, away = await asyncio.gather(*[
+        _collect_side_async(collection_ref, side, team_id, field_paths, start_after, page_size) for side in TEAM_SIDES
+    ])
+
+    highlights = []
+    for highlight in merge_sides(iter(home), iter(away)):
+        highlights.append(highlight)
+        if page_size and len(highlights) == page_size:
+            break
+
+    await asyncio.to_thread(rehydrate_scenes, highlights[:limit] if limit else highlights, fields)
+    return build_feed_page(highlights, limit, fields)
+
+
+async def _collect_side_async(collection_ref, side_field, team_id, field_paths, cursor, page_size) -> List[dict]:
+    """Reads up to page_size feed highlights of one side, enough to fill a page after merging."""
+    highlights = []
+    start_after = cursor
+    while True:
+        query = build_team_query(collection_ref, side_field, team_id, field_paths, start_after, page_size)
+        snapshots = [snapshot async for snapshot in query.stream()]
+        for snapshot in snapshots:
+            highlight = normalize_highlight(snapshot.to_dict())
+            if is_feed_highlight(highlight):
+                highlights.append(highlight)
+                if page_size and len(highlights) == page_size:
+                    return highlights
+        if not page_size or len(snapshots) < page_size:
+            return highlights
+        start_after = snapshots[-1]
+
+
+def rehydrate_scenes(highlights: List[dict], fields: Optional[List[str]]):
+    """Reads offloaded scenes back from GCS, only for the highlights of the page and only when scenes are wanted."""
+    if fields is not None and "scenes" not in fields:
+        return
+    for highlight in highlights:
+        highlight["storyboard"] = rehydrate(highlight["storyboard"])
+
+
+def build_feed_page(highlights: List[dict], limit: Optional[int], fields: Optional[List[str]]) -> dict:
+    if limit is None:
+        return {"highlights": [project(highlight, fields) for highlight in highlights]}
+    page = highlights[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(highlights) > limit else None
+    return {"highlights": [project(highlight, fields) for highlight in page], "nextCursor": next_cursor}
+
+
+def sort_key(highlight: dict):
+    return _game_datetime(highlight["gameDate"]), str(highlight["gamePk"])
+
+
+def _game_datetime(game_date) -> datetime:
+    # Upcoming games stored by check_next_game keep the raw ISO string
+    if isinstance(game_date, str):
+        game_date = datetime.fromisoformat(game_date.replace("Z", ISO_FORMAT))
+    if game_date.tzinfo is None:
+        game_date = game_date.replace(tzinfo=timezone.utc)
+    return game_date
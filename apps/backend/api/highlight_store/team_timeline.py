@@ -0,0 +1,237 @@
+import copy
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.cloud import firestore
+
+from apps.backend.api.highlight_store.team_feed import HIGHLIGHTS_COLLECTION, TEAM_SIDES, is_feed_highlight, \
+    sort_key, build_feed_page, decode_cursor, fetch_team_feed, fetch_team_feed_async
+from apps.backend.utils.log_util import logger
+
+TIMELINE_COLLECTION = "team_timelines"
+# The fields a timeline entry keeps, enough to render a team's list view
+TIMELINE_FIELDS = ["gamePk", "gameDate", "homeTeam", "awayTeam", "status", "updatedAt"]
+TIMELINE_STORYBOARD_FIELDS = ["storyTitle", "teaserSummary", "storyImageUrl"]
+# Keeps a timeline document far below the 1 MiB limit, older games are then read from the highlights collection
+MAX_TIMELINE_ENTRIES = 1000
+
+# A highlight write is ("create" | "set" | "update", data), or None to leave the highlight untouched
+HighlightWrite = Optional[Tuple[str, dict]]
+WriteBuilder = Callable[[Optional[dict]], HighlightWrite]
+
+
+def build_timeline_entry(highlight: dict) -> dict:
+    """Builds the summary of a highlight stored in its teams' timelines."""
+    entry = {field: highlight[field] for field in TIMELINE_FIELDS if field in highlight}
+    entry["gamePk"] = str(highlight["gamePk"])
+    storyboard = highlight.get("storyboard")
+    if isinstance(storyboard, dict):
+        entry["storyboard"] = {field: storyboard[field] for field in TIMELINE_STORYBOARD_FIELDS if field in storyboard}
+    return entry
+
+
+def serves_fields(fields: Optional[List[str]]) -> bool:
+    """Whether a feed projection can be answered from the timeline alone."""
+    return fields is not None and all(field in TIMELINE_FIELDS or field in TIMELINE_STORYBOARD_FIELDS
+                                      for field in fields)
+
+
+def write_highlights(db, builders: Dict[str, WriteBuilder],
+                     update_timelines: bool = True) -> Dict[str, Tuple[Optional[dict], Optional[dict]]]:
+    """Writes highlights and the timelines of every team they touch in one transaction.
+
+    Each builder gets the stored highlight (None if it does not exist yet) and returns the write to apply.
+    Builders may run more than once when the transaction is retried, so they must not have side effects.
+
+    Args:
+        db: The Firestore client.
+        builders: The write builder of every highlight to write, keyed by gamePk.
+        update_timelines: Leave the timelines out, for bulk writes that rebuild them once at the end.
+
+    Returns:
+        The (stored, written) highlight of every gamePk, written is None when the builder skipped it.
+    """
+    transaction = db.transaction()
+    return _write_highlights_in_transaction(transaction, db, builders, update_timelines)
+
+
+def write_highlight(db, game_pk_str: str, builder: WriteBuilder) -> Tuple[Optional[dict], Optional[dict]]:
+    """Writes a single highlight and its teams' timelines, see write_highlights."""
+    return write_highlights(db, {game_pk_str: builder})[game_pk_str]
+
+
+@firestore.transactional
+def _write_highlights_in_transaction(transaction, db, builders, update_timelines=True):
+    highlights_ref = db.collection(HIGHLIGHTS_COLLECTION)
+    doc_refs = [highlights_ref.document(game_pk_str) for game_pk_str in builders]
+    stored = {snapshot.id: snapshot.to_dict() if snapshot.exists else None
+              for snapshot in transaction.get_all(doc_refs)}
+
+    writes = []
+    results = {}
+    for doc_ref in doc_refs:
+        existing = stored.get(doc_ref.id)
+        write = builders[doc_ref.id](copy.deepcopy(existing) if existing else None)
+        if write is None:
+            results[doc_ref.id] = (existing, None)
+            continue
+        operation, data = write
+        written = _apply_write(existing, operation, data)
+        writes.append((doc_ref, operation, data))
+        results[doc_ref.id] = (existing, written)
+
+    changed = [(game_pk_str, existing, written) for game_pk_str, (existing, written) in results.items()
+               if written is not None]
+    timeline_updates = _read_timelines(transaction, db, changed) if update_timelines else {}
+
+    # Firestore transactions need every read done before the first write
+    for doc_ref, operation, data in writes:
+        getattr(transaction, operation)(doc_ref, data)
+    for timeline_ref, timeline in timeline_updates.items():
+        transaction.set(timeline_ref, timeline)
+    return results
+
+
+def _read_timelines(transaction, db, changed: List[Tuple[str, Optional[dict], dict]]) -> dict:
+    """Reads the timelines of every team a change touches and returns them with the changes applied."""
+    team_changes = {}
+    for game_pk_str, existing, written in changed:
+        for team_id in set(_team_ids(existing) + _team_ids(written)):
+            team_changes.setdefault(team_id, []).append((game_pk_str, written))
+    if not team_changes:
+        return {}
+
+    timelines_ref = db.collection(TIMELINE_COLLECTION)
+    timeline_refs = [timelines_ref.document(str(team_id)) for team_id in team_changes]
+    updated = {}
+    for snapshot in transaction.get_all(timeline_refs):
+        team_id = int(snapshot.id)
+        timeline = snapshot.to_dict() if snapshot.exists else {}
+        entries = {entry["gamePk"]: entry for entry in timeline.get("entries", [])}
+        for game_pk_str, written in team_changes[team_id]:
+            entries.pop(game_pk_str, None)
+            if team_id in _team_ids(written) and written.get("gameDate"):
+                entries[game_pk_str] = build_timeline_entry({**written, "gamePk": game_pk_str})
+        updated[snapshot.reference] = _timeline_document(team_id, entries.values(), timeline.get("truncated", False))
+    return updated
+
+
+def _timeline_document(team_id: int, entries: Iterable[dict], truncated: bool = False) -> dict:
+    entries = sorted(entries, key=sort_key, reverse=True)
+    return {
+        "teamId": team_id,
+        "entries": entries[:MAX_TIMELINE_ENTRIES],
+        "truncated": truncated or len(entries) > MAX_TIMELINE_ENTRIES,
+        "updatedAt": firestore.SERVER_TIMESTAMP,
+    }
+
+
+def read_timeline_page(timeline: dict, limit: Optional[int], start_after: Optional[dict]) -> Optional[List[dict]]:
+    """Selects the feed entries of a timeline after the cursor, up to limit + 1 of them.
+
+    Returns:
+        The entries, or None when the page reaches past the oldest entry of a truncated timeline.
+    """
+    entries = [entry for entry in timeline.get("entries", []) if is_feed_highlight(entry)]
+    if start_after:
+        cursor_key = sort_key(start_after)
+        entries = [entry for entry in entries if sort_key(entry) < cursor_key]
+    if limit and len(entries) > limit:
+        return entries[:limit + 1]
+    if timeline.get("truncated"):
+        return None
+    return entries
+
+
+def read_team_feed(db, team_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   fields: Optional[List[str]] = None) -> dict:
+    """Reads a page of a team's feed, from its timeline (one document read) when the projection allows it.
+
+    Full highlights, missing timelines and pages past a truncated timeline fall back to fetch_team_feed.
+    """
+    if serves_fields(fields):
+        snapshot = db.collection(TIMELINE_COLLECTION).document(str(team_id)).get()
+        feed_page = _timeline_feed_page(snapshot, limit, cursor, fields)
+        if feed_page is not None:
+            return feed_page
+    return fetch_team_feed(db, team_id, limit=limit, cursor=cursor, fields=fields)
+
+
+async def read_team_feed_async(db, team_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                               fields: Optional[List[str]] = None) -> dict:
+    """The AsyncClient counterpart of read_team_feed."""
+    if serves_fields(fields):
+        snapshot = await db.collection(TIMELINE_COLLECTION).document(str(team_id)).get()
+        feed_page = _timeline_feed_page(snapshot, limit, cursor, fields)
+        if feed_page is not None:
+            return feed_page
+    return await fetch_team_feed_async(db, team_id, limit=limit, cursor=cursor, fields=fields)
+
+
+def _timeline_feed_page(snapshot, limit, cursor, fields) -> Optional[dict]:
+    if not snapshot.exists:
+        return None
+    entries = read_timeline_page(snapshot.to_dict(), limit, decode_cursor(cursor))
+    if entries is None:
+        return None
+    return build_feed_page(entries, limit, fields)
+
+
+def rebuild_team_timeline(db, team_id: int) -> int:
+    """Rebuilds a team's timeline from the highlights collection, e.g. for games written before timelines existed."""
+    highlights_ref = db.collection(HIGHLIGHTS_COLLECTION)
+    entries = {}
+    for side in TEAM_SIDES:
+        for snapshot in highlights_ref.where(side, "==", team_id).stream():
+            highlight = snapshot.to_dict()
+            if highlight.get("gamePk") and highlight.get("gameDate"):
+                entry = build_timeline_entry(highlight)
+                entries[entry["gamePk"]] = entry
+    db.collection(TIMELINE_COLLECTION).document(str(team_id)).set(_timeline_document(team_id, entries.values()))
+    logger.info(f"Rebuilt timeline for team {team_id} with {len(entries)} entries.")
+    return len(entries)
+
+
+def migrate_numeric_game_pks(db) -> int:
+    """Rewrites the gamePk of highlights that stored it as a number as a string, returning how many it rewrote."""
+    migrated = 0
+    # Range filters only match values of their own type, this reads the numeric gamePks alone
+    for snapshot in db.collection(HIGHLIGHTS_COLLECTION).where("gamePk", ">=", 0).stream():
+        snapshot.reference.update({"gamePk": str(snapshot.get("gamePk"))})
+        migrated += 1
+    logger.info(f"Migrated {migrated} numeric gamePks.")
+    return migrated
+
+
+def _apply_write(existing: Optional[dict], operation: str, data: dict) -> dict:
+    """Computes the highlight a write leaves behind, resolving dotted field paths of updates."""
+    if operation != "update":
+        return copy.deepcopy(data)
+    highlight = copy.deepcopy(existing) if existing else {}
+    for field_path, value in data.items():
+        target = highlight
+        *parents, leaf = field_path.split(".")
+        for parent in parents:
+            if not isinstance(target.get(parent), dict):
+                target[parent] = {}
+            target = target[parent]
+        target[leaf] = value
+    return highlight
+
+
+def _team_ids(highlight: Optional[dict]) -> List[int]:
+    if not highlight:
+        return []
+    return [highlight[side] for side in TEAM_SIDES if isinstance(highlight.get(side), int)]
+
+
+if __name__ == "__main__":
+    from apps.backend.api.highlight_store.storyboard_store import migrate_legacy_storyboards
+    from apps.backend.utils.clients import get_firestore_client
+    from apps.backend.utils.constants import TEAMS
+
+    client = get_firestore_client()
+    migrate_numeric_game_pks(client)
+    # Projected feed queries skip JSON string storyboards, migrate them before the timelines are rebuilt from them
+    migrate_legacy_storyboards(client)
+    for team in TEAMS:
+        rebuild_team_timeline(client, team["teamId"])
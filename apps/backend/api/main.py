@@ -1,71 +1,108 @@
 import logging
 from datetime import datetime, timezone
+from typing import Optional
 
-from flask import Flask, jsonify, request
-from google.cloud import firestore, pubsub_v1
+from flask import Flask, g, jsonify, request
 
+from apps.backend.api.genai.generation_cache import generation_cache
 from apps.backend.api.highlight_generation.highlight_generator import generate_game_highlights
+from apps.backend.api.highlight_store.bulk_ingest import create_highlights_if_absent, MAX_BATCH_SIZE, CREATED, \
+    CONFLICT, INVALID, FAILED
+from apps.backend.api.highlight_store.storyboard_store import delete_unused_scenes, \
+    to_document as storyboard_to_document
+from apps.backend.api.highlight_store.team_feed import parse_fields, parse_limit, InvalidFeedRequest
+from apps.backend.api.highlight_store.team_timeline import read_team_feed, write_highlight
+from apps.backend.api.mlb_data_fetching.season_backfill import start_backfill_job, get_backfill_job, \
+    season_date_range
 from apps.backend.api.mlb_data_fetching.team_schedules_processor import process_past_games, check_next_game
-from apps.backend.config import PROJECT_ID, DATABASE_ID
-from apps.backend.utils.constants import TEAMS, ISO_FORMAT
-
-# Initialize Firestore client
-db = firestore.Client(
-    project=PROJECT_ID,  # Your Google Cloud project ID
-    database=DATABASE_ID
-)
-# Initialize Pub/Sub Publisher
-publisher = pubsub_v1.PublisherClient()
-topic_path = publisher.topic_path("slimeify", "sluggers-process-game-status")
+from apps.backend.utils.cache_utils import highlights_cache, get_team_highlights_generation, cache_team_highlights, \
+    invalidate_team_highlights
+from apps.backend.utils.clients import get_firestore_client
+from apps.backend.utils.constants import TEAMS, ISO_FORMAT, GENERATION_RETRY_AFTER_SECONDS
+from apps.backend.utils.http_utils import EncodedBody, build_response_headers, etag_matches, negotiate_encoding
+from apps.backend.utils.pubsub_utils import flush_publishes, start_publish_batch
+from apps.backend.utils.rate_limiter import rate_limiter
+from apps.backend.utils.retry_utils import is_rate_limited, retry_metrics
 
 app = Flask(__name__)
 
 
+@app.before_request
+def start_pubsub_batch():
+    g.pubsub_batch = start_publish_batch()
+
+
+@app.teardown_request
+def flush_pubsub_messages(_exception=None):
+    """Sends the Pub/Sub messages queued while handling this request, all in about one round trip."""
+    batch = g.pop("pubsub_batch", None)
+    if batch is not None:
+        flush_publishes(batch)
+
+
+def serialize_body(payload) -> EncodedBody:
+    """Serializes a payload exactly as jsonify would, so cached and fresh responses are identical."""
+    return EncodedBody(f"{app.json.dumps(payload)}\n".encode("utf-8"))
+
+
+def _json_response(encoded_body: EncodedBody, status: int):
+    """Answers with 304 when the client already has this body, otherwise with the best encoding it accepts."""
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding"), len(encoded_body))
+    if etag_matches(request.headers.get("If-None-Match"), encoded_body.etag):
+        return app.response_class(status=304, headers=build_response_headers(encoded_body, encoding,
+                                                                             not_modified=True))
+    return app.response_class(encoded_body.encoded(encoding), status=status, mimetype="application/json",
+                              headers=build_response_headers(encoded_body, encoding))
+
+
+# TEAMS is static, so its body, ETag and compressed variants are built once at startup
+teams_body = serialize_body(TEAMS).precompress()
+
+
 # Endpoint to fetch all MLB teams
 @app.route("/teams", methods=["GET"])
 def get_teams():
-    return jsonify(TEAMS), 200
+    return _json_response(teams_body, 200)
 
 
 # Endpoint to fetch highlights for a specific team
+# Optional params: limit (page size), cursor (nextCursor of the previous page), fields (comma separated projection)
 @app.route("/highlights/<int:team_id>", methods=["GET"])
 def get_highlights(team_id):
     try:
-        highlights_ref = db.collection("highlights")
-        query_home = highlights_ref.where("homeTeam", "==", team_id).stream()
-        query_away = highlights_ref.where("awayTeam", "==", team_id).stream()
-
-        results = {}
-
-        def process_query(query, label):
-            print(f"Processing {label} query for team ID {team_id}...")
+        limit = parse_limit(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        fields = parse_fields(request.args.get("fields"))
+    except InvalidFeedRequest as e:
+        return jsonify({"error": str(e)}), 400
 
-            for doc in query:
-                highlight = doc.to_dict()
-                game_pk = highlight.get("gamePk")
+    cache_key = (team_id, limit, cursor, tuple(fields) if fields else None)
+    cached_body = highlights_cache.get(cache_key)
+    if cached_body is not None:
+        return _json_response(cached_body, 200)
 
-                # Validate storyboard existence (now a dict, not a list)
-                if game_pk and isinstance(highlight.get("storyboard"), dict):
-                    results[game_pk] = highlight  # Store highlight by gamePk
-
-        # Process both queries
-        process_query(query_home, "home")
-        process_query(query_away, "away")
+    try:
+        # Read the generation before querying so a concurrent write keeps this result out of the cache
+        generation = get_team_highlights_generation(team_id)
+        logging.info(f"Fetching highlights page for team ID {team_id} (limit={limit}, fields={fields})...")
+        feed_page = read_team_feed(get_firestore_client(), team_id, limit=limit, cursor=cursor, fields=fields)
 
         # If no results, return 404
-        if not results:
-            print(f"No highlights found for team {team_id}.")
+        if not feed_page["highlights"] and not cursor:
+            logging.info(f"No highlights found for team {team_id}.")
             return jsonify({"error": f"No highlights found for team {team_id}"}), 404
 
-        # Ensure sorting by gameDate in descending order
-        sorted_highlights = sorted(results.values(), key=lambda h: h["gameDate"], reverse=True)
-
-        return jsonify({"highlights": sorted_highlights}), 200
+        body = serialize_body(feed_page)
+        cache_team_highlights(cache_key, body, generation)
+        return _json_response(body, 200)
 
+    except InvalidFeedRequest as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error fetching highlights for team {team_id}: {e}")
+        logging.error(f"Error fetching highlights for team {team_id}: {e}")
         return jsonify({"error": f"An internal error occurred - {str(e)}"}), 500
 
+
 # Endpoint to create a new highlight
 @app.route("/highlights", methods=["POST"])
 def add_highlight():
@@ -73,47 +110,30 @@ def add_highlight():
         # Parse the incoming JSON payload
         data = request.get_json()
 
-        # Validate required fields
-        required_fields = ["gamePk", "homeTeam", "awayTeam", "gameDate", "storyboard"]
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
+        validation_error = _validate_highlight(data)
+        if validation_error:
+            return jsonify({"error": validation_error}), 400
 
-        # Validate 'homeTeam' and 'awayTeam' fields
-        if not isinstance(data["homeTeam"], int) or not isinstance(data["awayTeam"], int):
-            return jsonify({"error": "'homeTeam' and 'awayTeam' must be objects."}), 400
-
-        # Validate 'storyboard' - it must be a dictionary
-        if not isinstance(data.get("storyboard"), dict):
-            return jsonify({"error": "'storyboard' must be an object, not an array."}), 400
-
-        # Validate required storyboard fields
-        required_storyboard_fields = ["storyTitle", "teaserSummary", "scenes"]
-        missing_storyboard_fields = [field for field in required_storyboard_fields if field not in data["storyboard"]]
-
-        if missing_storyboard_fields:
-            return jsonify(
-                {"error": f"Missing required storyboard fields: {', '.join(missing_storyboard_fields)}"}), 400
-
-        # Validate 'scenes' inside storyboard - it must be a list of objects
-        if not isinstance(data["storyboard"]["scenes"], list) or not all(
-                isinstance(scene, dict) for scene in data["storyboard"]["scenes"]):
-            return jsonify({"error": "'scenes' inside 'storyboard' must be an array of objects."}), 400
         # Convert gamePk to string for consistency
         game_pk_str = str(data["gamePk"])
 
-        # Check if gamePk already exists
-        doc_ref = db.collection("highlights").document(game_pk_str)
-        if doc_ref.get().exists:
-            return jsonify({"error": f"Highlight with gamePk {game_pk_str} already exists."}), 409  # 409 Conflict
-
-        # Add timestamps to the record
-        data["gameDate"] = datetime.fromisoformat(data["gameDate"].replace("Z", ISO_FORMAT))
-        data["updatedAt"] = datetime.utcnow()
-        data["createdAt"] = datetime.utcnow()
+        # Add timestamps to the record and store the storyboard natively
+        _prepare_highlight_record(data)
+        # Large scenes are moved to a compressed GCS object to keep the document well under 1 MiB
+        data["storyboard"] = storyboard_to_document(data["storyboard"], game_pk_str)
 
-        # Insert into Firestore
-        doc_ref.set(data)
+        # Insert into Firestore together with both team timelines, unless gamePk already exists
+        try:
+            stored, written = write_highlight(get_firestore_client(), game_pk_str,
+                                              lambda existing: None if existing else ("create", data))
+        except Exception:
+            delete_unused_scenes(data, None)
+            raise
+        if written is None:
+            # The scenes offloaded above are not referenced by the existing highlight
+            delete_unused_scenes(data, stored)
+            return jsonify({"error": f"Highlight with gamePk {game_pk_str} already exists."}), 409  # 409 Conflict
+        invalidate_team_highlights(data["homeTeam"], data["awayTeam"])
 
         return jsonify({"message": "Highlight added successfully", "gamePk": game_pk_str}), 201
 
@@ -123,6 +143,60 @@ def add_highlight():
         return jsonify({"error": f"An internal error occurred - Error adding highlight: {str(e)}"}), 500
 
 
+# Endpoint to create many highlights at once, e.g. for backfills. Existing highlights are never overwritten.
+@app.route("/highlights:batch", methods=["POST"])
+def add_highlights_batch():
+    try:
+        items = request.get_json()
+        if not isinstance(items, list):
+            return jsonify({"error": "Request body must be an array of highlights."}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"A batch can hold at most {MAX_BATCH_SIZE} highlights."}), 400
+
+        results = []
+        highlights_to_create = {}
+        for index, data in enumerate(items):
+            result = {"index": index, "gamePk": str(data["gamePk"]) if isinstance(data, dict) and "gamePk" in data
+                      else None}
+            results.append(result)
+
+            validation_error = _validate_highlight(data)
+            if not validation_error and result["gamePk"] in highlights_to_create:
+                validation_error = f"Duplicate gamePk {result['gamePk']} in batch."
+            if not validation_error:
+                try:
+                    _prepare_highlight_record(data)
+                except (ValueError, AttributeError):
+                    validation_error = "'gameDate' must be an ISO 8601 date-time string."
+            if validation_error:
+                result.update({"status": INVALID, "error": validation_error})
+                continue
+            highlights_to_create[result["gamePk"]] = data
+
+        # Created with their teams' timelines, a transaction per 200 games instead of a get() and set() per game.
+        # Storyboards are converted (and large scenes offloaded) only for the games that do not exist yet.
+        write_errors = create_highlights_if_absent(get_firestore_client(), highlights_to_create)
+
+        for result in results:
+            if "status" in result:
+                continue
+            status, error = write_errors.get(result["gamePk"], (CREATED, None))
+            result["status"] = status
+            if error:
+                result["error"] = error
+            if status == CREATED:
+                data = highlights_to_create[result["gamePk"]]
+                invalidate_team_highlights(data["homeTeam"], data["awayTeam"])
+
+        summary = {status: sum(1 for result in results if result["status"] == status)
+                   for status in (CREATED, CONFLICT, INVALID, FAILED)}
+        return jsonify({"results": results, "summary": summary}), 207 if summary[CREATED] != len(results) else 201
+
+    except Exception as e:
+        logging.error(f"Error adding highlights batch: {e}")
+        return jsonify({"error": f"An internal error occurred - Error adding highlights batch: {str(e)}"}), 500
+
+
 # Endpoint to process final game data and queue upcoming games
 @app.route("/highlights/process/<int:season>/", methods=["GET"])
 def process_highlights(season):
@@ -160,14 +234,54 @@ def process_highlights(season):
         return jsonify({"error": f"An internal error occurred - {str(e)}"}), 500
 
 
+# Endpoint to reprocess every final game of a season, or of a date range of it
+@app.route("/highlights/backfill/<int:season>/", methods=["POST"])
+def backfill_highlights(season):
+    """API endpoint to backfill a season with a few date-range schedule requests, optionally for one team.
+
+    The backfill runs in the background, its progress is served by /highlights/backfill/jobs/<job_id>.
+    """
+    try:
+        start_date = request.args.get("startDate")
+        end_date = request.args.get("endDate")
+        team_param = request.args.get("teamId")
+        team_id = int(team_param) if team_param else None
+
+        try:
+            season_date_range(season, start_date, end_date)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date range. Use YYYY-MM-DD. {e}"}), 400
+
+        job = start_backfill_job(season, start_date, end_date, team_id)
+        return jsonify(job), 202, {"Location": f"/highlights/backfill/jobs/{job['jobId']}"}
+
+    except Exception as e:
+        logging.error(f"Error backfilling season {season}: {e}")
+        return jsonify({"error": f"An internal error occurred - {str(e)}"}), 500
+
+
+@app.route("/highlights/backfill/jobs/<string:job_id>", methods=["GET"])
+def get_backfill_job_status(job_id):
+    job = get_backfill_job(job_id)
+    if job is None:
+        return jsonify({"error": f"No backfill job {job_id} on this instance."}), 404
+    return jsonify(job), 200
+
+
 @app.route("/highlights/generate/<string:game_pk>", methods=["GET"])
 def generate_highlights(game_pk):
     try:
-        generated_highlights = generate_game_highlights(game_pk)
+        # ?regenerate=true skips the generation cache, for a deliberate regeneration
+        regenerate = request.args.get("regenerate", "").lower() == "true"
+        generated_highlights = generate_game_highlights(game_pk, regenerate=regenerate)
         return jsonify(generated_highlights), 200
     except Exception as e:
         # Log and return the error
         logging.error(f"Error generating highlights for game_pk: {game_pk}: {e}")
+        if is_rate_limited(e):
+            # The caller retries later instead of this request sleeping through the rate limit
+            return jsonify({"error": f"Rate limited - {str(e)}"}), 429, \
+                {"Retry-After": str(GENERATION_RETRY_AFTER_SECONDS)}
         return jsonify({"error": f"An internal error occurred - {str(e)}"}), 500
 
 
@@ -180,17 +294,19 @@ def update_highlight(game_pk):
         # Parse incoming JSON payload
         update_data = request.get_json()
 
-        # Reference the document in Firestore
-        doc_ref = db.collection("highlights").document(game_pk)
-        doc = doc_ref.get()
+        # Update Firestore document and both team timelines, if it exists
+        update_data["updatedAt"] = datetime.utcnow().replace(tzinfo=timezone.utc)
+        if "storyboard" in update_data:
+            update_data["storyboard"] = storyboard_to_document(update_data["storyboard"], game_pk)
+        stored_data, written = write_highlight(get_firestore_client(), game_pk,
+                                               lambda existing: ("update", update_data) if existing else None)
 
         # Check if document exists
-        if not doc.exists:
+        if written is None:
             return jsonify({"error": f"Highlight with gamePk {game_pk} not found"}), 404
 
-        # Update Firestore document
-        update_data["updatedAt"] = datetime.utcnow().replace(tzinfo=timezone.utc)
-        doc_ref.update(update_data)
+        invalidate_team_highlights(stored_data.get("homeTeam"), stored_data.get("awayTeam"),
+                                   written.get("homeTeam"), written.get("awayTeam"))
 
         return jsonify({"message": f"Highlight {game_pk} updated successfully"}), 200
 
@@ -199,6 +315,71 @@ def update_highlight(game_pk):
         return jsonify({"error": f"An internal error occurred - {str(e)}"}), 500
 
 
+# Endpoint exposing the highlight feed cache counters, used to size the cache
+@app.route("/highlights/cache/stats", methods=["GET"])
+def get_highlights_cache_stats():
+    return jsonify(highlights_cache.stats()), 200
+
+
+# Endpoint exposing the attempt counters of every retried operation
+@app.route("/highlights/retry/stats", methods=["GET"])
+def get_retry_stats():
+    return jsonify(retry_metrics.stats()), 200
+
+
+# Endpoint exposing the Gemini generation cache counters
+@app.route("/highlights/generation-cache/stats", methods=["GET"])
+def get_generation_cache_stats():
+    return jsonify(generation_cache.stats()), 200
+
+
+# Endpoint exposing the current rate and counters of every rate-limited backend
+@app.route("/highlights/rate-limits/stats", methods=["GET"])
+def get_rate_limit_stats():
+    return jsonify(rate_limiter.stats()), 200
+
+
+def _validate_highlight(data) -> Optional[str]:
+    """Validates a new highlight payload, returning the error message or None if it is valid."""
+    if not isinstance(data, dict):
+        return "Highlight must be an object."
+
+    # Validate required fields
+    required_fields = ["gamePk", "homeTeam", "awayTeam", "gameDate", "storyboard"]
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        return f"Missing required fields: {', '.join(missing_fields)}"
+
+    # Validate 'homeTeam' and 'awayTeam' fields
+    if not isinstance(data["homeTeam"], int) or not isinstance(data["awayTeam"], int):
+        return "'homeTeam' and 'awayTeam' must be objects."
+
+    # Validate 'storyboard' - it must be a dictionary
+    if not isinstance(data.get("storyboard"), dict):
+        return "'storyboard' must be an object, not an array."
+
+    # Validate required storyboard fields
+    required_storyboard_fields = ["storyTitle", "teaserSummary", "scenes"]
+    missing_storyboard_fields = [field for field in required_storyboard_fields if field not in data["storyboard"]]
+    if missing_storyboard_fields:
+        return f"Missing required storyboard fields: {', '.join(missing_storyboard_fields)}"
+
+    # Validate 'scenes' inside storyboard - it must be a list of objects
+    if not isinstance(data["storyboard"]["scenes"], list) or not all(
+            isinstance(scene, dict) for scene in data["storyboard"]["scenes"]):
+        return "'scenes' inside 'storyboard' must be an array of objects."
+    return None
+
+
+def _prepare_highlight_record(data):
+    """Adds the timestamps and converts the gamePk and the gameDate to their stored form."""
+    # Stored as a string like every other writer does, so feeds order and page it the same way everywhere
+    data["gamePk"] = str(data["gamePk"])
+    data["gameDate"] = datetime.fromisoformat(data["gameDate"].replace("Z", ISO_FORMAT))
+    data["updatedAt"] = datetime.utcnow()
+    data["createdAt"] = datetime.utcnow()
+
+
 # Main entry point
 if __name__ == "__main__":
     # Run the Flask app on port 8080
@@ -1,36 +1,58 @@
-import requests
+import io
+from typing import BinaryIO
 
-from apps.backend.utils.constants import MLB_STATS_API_BASE_URL
+from apps.backend.api.data_model.play_table import PlayTable
+from apps.backend.api.mlb_data_fetching.gumbo_store import gumbo_store, open_feed_file, parse_feed_file_name
+from apps.backend.api.mlb_data_fetching.gumbo_stream import prune_feed, HIGHLIGHT_FEED_PATHS
+from apps.backend.api.mlb_data_fetching.mlb_client import mlb_client
 
-MIDDLE_URL_SEGMENT = "v1.1/game/"
-GAME_FEED_ENDPOINT = "/feed/live"
+GAME_FEED_PATH = "v1.1/game/{game_pk}/feed/live"
+GAME_FEED_TIMESTAMPS_PATH = "v1.1/game/{game_pk}/feed/live/timestamps"
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def open_game_feed(game_pk, refresh=False) -> BinaryIO:
+    """Opens a game's GUMBO feed as a stream of JSON bytes, through the feed store.
+
+    A finished game is read from the store without any request, a stored live game only when the feed's
+    timestamps show it has not changed since. Otherwise the feed is streamed from the API into the store,
+    never held in memory whole. refresh skips the store.
+    """
+    path = None if refresh else gumbo_store.local_feed(game_pk)
+    if path is not None:
+        timestamp, final = parse_feed_file_name(path.name)
+        if not final and _latest_timestamp(game_pk) != timestamp:
+            path = None
+
+    if path is None:
+        with mlb_client.stream(GAME_FEED_PATH.format(game_pk=game_pk)) as response:
+            path = gumbo_store.save_stream(game_pk, response.iter_content(STREAM_CHUNK_BYTES))
+        if path is None:
+            # The store is not writable, the feed is read from memory instead
+            return io.BytesIO(mlb_client.get(GAME_FEED_PATH.format(game_pk=game_pk)).content)
+    return open_feed_file(path)
+
+
+def fetch_game_extract(game_pk, refresh=False):
+    """Fetches only what the highlight generation reads from a game's feed, see prune_feed.
+
+    The result is shaped like the full feed, so extract_play_by_play and extract_game_overview work on it,
+    but without pitch-by-pitch events, boxscore or players its size no longer depends on the game.
+    """
+    with open_game_feed(game_pk, refresh) as stream:
+        return prune_feed(stream, HIGHLIGHT_FEED_PATHS)
+
+
+def _latest_timestamp(game_pk):
+    # A list of a few KB, the timeStamp of every version of the feed, oldest first
+    timestamps = mlb_client.get_json(GAME_FEED_TIMESTAMPS_PATH.format(game_pk=game_pk))
+    return timestamps[-1] if timestamps else None
 
-def fetch_single_game_data(game_pk):
-    url = _game_url_builder(game_pk)
-    response = requests.get(url)
-    return response.json()
 
 # Extract play-by-play details
-def extract_play_by_play(game_data):
-    plays = game_data["liveData"]["plays"]["allPlays"]
-    play_details = []
-    for play in plays:
-        result = play["result"]
-        about = play["about"]
-        match_up = play["matchup"]
-        play_info = {
-            "description": result["description"],
-            "inning": about["inning"],
-            "half": "Top" if about["isTopInning"] else "Bottom",
-            "event": result["event"],
-            "away_score": result["awayScore"],
-            "home_score": result["homeScore"],
-            "batter": match_up["batter"]["fullName"],
-            "pitcher": match_up["pitcher"]["fullName"],
-            "captivating_index": about["captivatingIndex"]
-        }
-        play_details.append(play_info)
-    return play_details
+def extract_play_by_play(game_data) -> PlayTable:
+    """The plays of a game as a PlayTable, whose rows are the dicts this used to return."""
+    return PlayTable.from_plays(game_data["liveData"]["plays"]["allPlays"])
 
 # Extract game overview
 def extract_game_overview(data):
@@ -46,5 +68,3 @@ def extract_game_overview(data):
     }
     return overview
 
-def _game_url_builder(game_pk):
-    return f"{MLB_STATS_API_BASE_URL}{MIDDLE_URL_SEGMENT}{game_pk}/{GAME_FEED_ENDPOINT}"
@@ -0,0 +1,218 @@
+"""Compressed store of GUMBO (/feed/live) documents, on local disk and in GCS.
+
+A feed is stored under its gamePk and its metaData.timeStamp (with a "-final" marker once the game is over,
+so neither needs the feed to be parsed), compressed with zstd when the zstandard package is installed and gzip
+otherwise. Every feed is kept on local disk. Finished-game feeds, which no longer change, are also copied to
+GCS so other instances and later runs read them instead of downloading them again.
+"""
+import gzip
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is always available
+    zstandard = None
+
+from apps.backend.api.mlb_data_fetching.gumbo_stream import read_feed_header
+from apps.backend.utils.constants import GUMBO_STORE_DIR, GUMBO_STORE_MAX_LOCAL_FEEDS
+from apps.backend.utils.gcs_utils import upload_bytes, download_bytes, list_blob_names
+from apps.backend.utils.log_util import logger
+
+GCS_PREFIX = "gumbo-feeds"
+GZIP_SUFFIX = ".json.gz"
+ZSTD_SUFFIX = ".json.zst"
+FINAL_MARKER = "-final"
+
+
+def feed_timestamp(feed: dict) -> str:
+    """The metaData.timeStamp of a feed, e.g. "20241030_040611", which changes whenever the feed does."""
+    return str(feed.get("metaData", {}).get("timeStamp", "0"))
+
+
+def is_final_feed(feed: dict) -> bool:
+    return feed.get("gameData", {}).get("status", {}).get("abstractGameState") == "Final"
+
+
+def parse_feed_file_name(name: str) -> Tuple[str, bool]:
+    """Returns the (metaData.timeStamp, whether the game was over) recorded in a stored feed's name."""
+    stem = name.rsplit("/", 1)[-1].split(".", 1)[0]
+    if stem.endswith(FINAL_MARKER):
+        return stem[:-len(FINAL_MARKER)], True
+    return stem, False
+
+
+def open_feed_file(path: Path) -> BinaryIO:
+    """Opens a stored feed as a stream of its decompressed JSON bytes."""
+    if path.name.endswith(ZSTD_SUFFIX):
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return gzip.open(path, "rb")
+
+
+def _compressed_writer(file_obj: BinaryIO) -> BinaryIO:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).stream_writer(file_obj, closefd=False)
+    return gzip.GzipFile(fileobj=file_obj, mode="wb", compresslevel=6, mtime=0)
+
+
+def _feed_file_name(timestamp: Optional[str], final: bool, suffix: str) -> str:
+    return f"{_safe(timestamp or '0')}{FINAL_MARKER if final else ''}{suffix}"
+
+
+class GumboFeedStore:
+    """Stores the latest feed of every game, see the module docstring.
+
+    Args:
+        local_dir: The local directory, one sub-directory per game.
+        bucket_name: The GCS bucket, defaults to the configured bucket.
+        max_local_feeds: The number of games kept on local disk, the least recently written are removed.
+    """
+
+    def __init__(self, local_dir: str = GUMBO_STORE_DIR, bucket_name: Optional[str] = None,
+                 max_local_feeds: int = GUMBO_STORE_MAX_LOCAL_FEEDS):
+        self.local_dir = Path(local_dir)
+        self._bucket_name = bucket_name
+        self.max_local_feeds = max_local_feeds
+        self._lock = threading.Lock()
+
+    @property
+    def bucket_name(self) -> str:
+        if self._bucket_name is None:
+            from apps.backend.config import BUCKET_URI
+            self._bucket_name = BUCKET_URI.replace("gs://", "")
+        return self._bucket_name
+
+    def load(self, game_pk) -> Optional[dict]:
+        """Returns the latest stored feed of a game, from local disk or else from GCS, or None."""
+        path = self.local_feed(game_pk)
+        if path is None:
+            return None
+        try:
+            with open_feed_file(path) as stream:
+                return json.load(stream)
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"Discarding unreadable stored feed {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def local_feed(self, game_pk) -> Optional[Path]:
+        """Returns the local file of the latest stored feed of a game, copying it from GCS if needed, or None."""
+        local_path = self._latest_local_path(game_pk)
+        if local_path is not None:
+            return local_path
+
+        try:
+            blob_names = [name for name in list_blob_names(self.bucket_name, f"{GCS_PREFIX}/{game_pk}/")
+                          if self._is_readable(name)]
+            if not blob_names:
+                return None
+            blob_name = max(blob_names)
+            data = download_bytes(f"gs://{self.bucket_name}/{blob_name}")
+        except Exception as e:
+            logger.warning(f"Could not read the stored feed of game {game_pk} from GCS: {e}")
+            return None
+        return self._write_local(game_pk, blob_name.rsplit("/", 1)[-1], lambda file_obj: file_obj.write(data))
+
+    def save(self, game_pk, feed: dict) -> Optional[Path]:
+        """Stores a parsed feed on local disk, and in GCS when the game is finished."""
+        data = json.dumps(feed, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return self.save_stream(game_pk, [data], feed_timestamp(feed), is_final_feed(feed))
+
+    def save_stream(self, game_pk, chunks: Iterable[bytes], timestamp: Optional[str] = None,
+                    final: Optional[bool] = None) -> Optional[Path]:
+        """Stores a feed from its raw JSON byte chunks, compressing them as they arrive, without parsing it.
+
+        Args:
+            game_pk: The game key.
+            chunks: The feed's JSON bytes, e.g. the chunks of a streamed response.
+            timestamp: The feed's metaData.timeStamp, read back from the stored feed when not given.
+            final: Whether the game is over, read back from the stored feed when not given.
+
+        Returns:
+            The local file of the stored feed, or None when it could not be written.
+        """
+        suffix = GZIP_SUFFIX if zstandard is None else ZSTD_SUFFIX
+
+        def write(file_obj):
+            with _compressed_writer(file_obj) as writer:
+                for chunk in chunks:
+                    writer.write(chunk)
+
+        incoming_name = f"incoming-{os.getpid()}-{threading.get_ident()}{suffix}"
+        path = self._write_local(game_pk, incoming_name, write, keep_others=True)
+        if path is None:
+            return None
+        if timestamp is None or final is None:
+            with open_feed_file(path) as stream:
+                timestamp, state = read_feed_header(stream)
+            final = state == "Final"
+
+        stored_path = path.with_name(_feed_file_name(timestamp, final, suffix))
+        os.replace(path, stored_path)
+        self._remove_others(stored_path)
+        if final:
+            try:
+                upload_bytes(self.bucket_name, f"{GCS_PREFIX}/{game_pk}/{stored_path.name}",
+                             stored_path.read_bytes(), "application/octet-stream")
+            except Exception as e:
+                logger.warning(f"Could not store the feed of game {game_pk} in GCS: {e}")
+        return stored_path
+
+    def _latest_local_path(self, game_pk) -> Optional[Path]:
+        game_dir = self.local_dir / _safe(str(game_pk))
+        if not game_dir.is_dir():
+            return None
+        paths = [path for path in game_dir.iterdir() if self._is_readable(path.name) and path.name[0].isdigit()]
+        return max(paths, key=lambda path: path.name) if paths else None
+
+    def _write_local(self, game_pk, file_name: str, write, keep_others: bool = False) -> Optional[Path]:
+        """Writes a file of a game through write(file_obj), renaming it into place once it is complete."""
+        game_dir = self.local_dir / _safe(str(game_pk))
+        try:
+            game_dir.mkdir(parents=True, exist_ok=True)
+            # Written to a temporary file and renamed, so readers never see a partial feed
+            with tempfile.NamedTemporaryFile(dir=game_dir, prefix="tmp", delete=False) as temp_file:
+                write(temp_file)
+            path = game_dir / file_name
+            os.replace(temp_file.name, path)
+            if not keep_others:
+                self._remove_others(path)
+            self._evict()
+            return path
+        except OSError as e:
+            logger.warning(f"Could not store the feed of game {game_pk} locally: {e}")
+            return None
+
+    @staticmethod
+    def _remove_others(path: Path):
+        """Removes the older feeds of the game, leaving files still being written alone."""
+        for other_path in path.parent.iterdir():
+            if other_path != path and other_path.name[0].isdigit():
+                other_path.unlink(missing_ok=True)
+
+    def _evict(self):
+        with self._lock:
+            game_dirs = [path for path in self.local_dir.iterdir() if path.is_dir()]
+            if len(game_dirs) <= self.max_local_feeds:
+                return
+            game_dirs.sort(key=lambda path: path.stat().st_mtime)
+            for game_dir in game_dirs[:len(game_dirs) - self.max_local_feeds]:
+                for path in game_dir.iterdir():
+                    path.unlink(missing_ok=True)
+                game_dir.rmdir()
+
+    @staticmethod
+    def _is_readable(name: str) -> bool:
+        return name.endswith(GZIP_SUFFIX) or (name.endswith(ZSTD_SUFFIX) and zstandard is not None)
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", name)
+
+
+gumbo_store = GumboFeedStore()
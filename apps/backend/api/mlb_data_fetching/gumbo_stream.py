@@ -0,0 +1,111 @@
+"""Streaming extraction from GUMBO feeds.
+
+A finished game's feed holds every pitch (playEvents), the boxscore and every player, several MB that become
+many times that as Python objects. prune_feed parses the feed's byte stream incrementally with ijson and only
+builds the subtrees it is asked for, so the peak memory of an extraction no longer grows with the feed.
+Without ijson the stream is parsed whole with json, which gives the same result with the old memory cost.
+"""
+import json
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:  # ijson is optional, json is always available
+    ijson = None
+
+# What extract_play_by_play, extract_game_overview and the highlight generation read from a feed
+HIGHLIGHT_FEED_PATHS = [
+    "gameData.teams.away.id",
+    "gameData.teams.away.name",
+    "gameData.teams.home.id",
+    "gameData.teams.home.name",
+    "gameData.venue.name",
+    "gameData.datetime.officialDate",
+    "gameData.gameInfo",
+    "gameData.weather",
+    "liveData.plays.allPlays.item.result",
+    "liveData.plays.allPlays.item.about",
+    "liveData.plays.allPlays.item.matchup.batter.fullName",
+    "liveData.plays.allPlays.item.matchup.pitcher.fullName",
+]
+HEADER_PATHS = ("metaData.timeStamp", "gameData.status.abstractGameState")
+
+
+def prune_feed(stream: BinaryIO, paths: Iterable[str] = HIGHLIGHT_FEED_PATHS) -> dict:
+    """Parses a feed keeping only the given paths, shaped like the full feed so the same extractors work.
+
+    Args:
+        stream: The feed's JSON byte stream.
+        paths: Dotted paths in ijson's prefix notation, "item" standing for every element of an array.
+
+    Returns:
+        The feed restricted to paths, or the whole feed when ijson is not installed.
+    """
+    if ijson is None:
+        return json.load(stream)
+
+    keep = set(paths)
+    ancestors = {""}
+    for path in keep:
+        parts = path.split(".")
+        ancestors.update(".".join(parts[:depth]) for depth in range(1, len(parts)))
+
+    root = {}
+    # (container, the key of the next value of a map, whether everything inside is kept)
+    stack = []
+    skip_depth = 0
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if skip_depth:
+            if event in ("start_map", "start_array"):
+                skip_depth += 1
+            elif event in ("end_map", "end_array"):
+                skip_depth -= 1
+            continue
+
+        if event == "map_key":
+            stack[-1][1] = value
+            continue
+        if event in ("end_map", "end_array"):
+            stack.pop()
+            continue
+
+        inside_kept = bool(stack) and stack[-1][2]
+        wanted = inside_kept or prefix in keep
+        if event in ("start_map", "start_array"):
+            if not wanted and prefix not in ancestors:
+                skip_depth = 1
+                continue
+            container = (root if not stack else {}) if event == "start_map" else []
+            if stack:
+                _attach(stack[-1], container)
+            stack.append([container, None, wanted])
+        elif wanted:
+            _attach(stack[-1], value)
+    return root
+
+
+def read_feed_header(stream: BinaryIO) -> Tuple[Optional[str], Optional[str]]:
+    """Reads (metaData.timeStamp, gameData.status.abstractGameState) from the start of a feed.
+
+    Both sit near the top of a feed, so with ijson only the first few KB are parsed.
+    """
+    if ijson is None:
+        feed = json.load(stream)
+        return (feed.get("metaData", {}).get("timeStamp"),
+                feed.get("gameData", {}).get("status", {}).get("abstractGameState"))
+
+    found = {}
+    for prefix, event, value in ijson.parse(stream):
+        if prefix in HEADER_PATHS and event in ("string", "number"):
+            found[prefix] = str(value)
+            if len(found) == len(HEADER_PATHS):
+                break
+    return found.get(HEADER_PATHS[0]), found.get(HEADER_PATHS[1])
+
+
+def _attach(parent: list, value):
+    container, key, _ = parent
+    if isinstance(container, list):
+        container.append(value)
+    else:
+        container[key] = value
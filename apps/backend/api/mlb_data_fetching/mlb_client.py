@@ -0,0 +1,163 @@
+"""The one client every MLB Stats API call goes through.
+
+It keeps connections alive in a pooled session, bounds every call with connect/read timeouts, retries 429 and
+5xx responses (waiting as long as Retry-After asks), and caps the concurrent calls to each host.
+"""
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urljoin, urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from apps.backend.utils.async_http import get_async_http_client
+from apps.backend.utils.constants import MLB_STATS_API_BASE_URL, MLB_CONNECT_TIMEOUT_SECONDS, \
+    MLB_READ_TIMEOUT_SECONDS, MLB_MAX_RETRIES, MLB_MAX_CONCURRENT_REQUESTS
+from apps.backend.utils.retry_utils import retry_call_async, parse_retry_after
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class MlbApiError(Exception):
+    """A response of the MLB Stats API that is not a success, after retries."""
+
+    def __init__(self, url: str, status_code: int, text: str, retry_after: Optional[float] = None):
+        super().__init__(f"MLB API request {url} failed with status {status_code}: {text[:200]}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class MlbClient:
+    """Pooled, timeout-aware MLB Stats API client, sync and async.
+
+    Args:
+        base_url: Relative paths are resolved against it, e.g. "v1/schedule".
+        max_concurrent_requests: The cap on concurrent calls per host, per process (sync) and per event loop (async).
+    """
+
+    def __init__(self, base_url: str = MLB_STATS_API_BASE_URL,
+                 max_concurrent_requests: int = MLB_MAX_CONCURRENT_REQUESTS):
+        self.base_url = base_url
+        self.max_concurrent_requests = max_concurrent_requests
+        self.timeout = (MLB_CONNECT_TIMEOUT_SECONDS, MLB_READ_TIMEOUT_SECONDS)
+        self.session = self._build_session()
+        self._host_semaphores = {}
+        self._async_host_semaphores = {}
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=MLB_MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_concurrent_requests, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def get(self, path: str, params: Optional[dict] = None, fields: Optional[Iterable[str]] = None,
+            timeout=None) -> requests.Response:
+        """GETs a path, returning the response whatever its status (retries are already spent).
+
+        Args:
+            path: A path relative to base_url, or an absolute URL.
+            params: Query parameters, None values are left out.
+            fields: The JSON fields to keep, passed as the API's fields= filter, e.g. ["gameData", "status"].
+            timeout: A (connect, read) timeout overriding the client's.
+        """
+        url = self._url(path)
+        with self._host_semaphore(url):
+            return self.session.get(url, params=self._params(params, fields), timeout=timeout or self.timeout)
+
+    def get_json(self, path: str, params: Optional[dict] = None, fields: Optional[Iterable[str]] = None,
+                 timeout=None) -> dict:
+        """GETs a path and returns its JSON body, raising MlbApiError when the response is not a success."""
+        response = self.get(path, params, fields, timeout)
+        if not response.ok:
+            raise MlbApiError(response.url, response.status_code, response.text)
+        return response.json()
+
+    @contextmanager
+    def stream(self, path: str, params: Optional[dict] = None, fields: Optional[Iterable[str]] = None,
+               timeout=None) -> Iterator[requests.Response]:
+        """GETs a path without reading its body, for large bodies consumed chunk by chunk with iter_content.
+
+        Raises MlbApiError when the response is not a success. The host's concurrency slot is held until
+        the body is consumed.
+        """
+        url = self._url(path)
+        with self._host_semaphore(url):
+            with self.session.get(url, params=self._params(params, fields), timeout=timeout or self.timeout,
+                                  stream=True) as response:
+                if not response.ok:
+                    raise MlbApiError(response.url, response.status_code, response.text)
+                yield response
+
+    async def get_async(self, path: str, params: Optional[dict] = None,
+                        fields: Optional[Iterable[str]] = None) -> httpx.Response:
+        """Async counterpart of get, retrying 429 and 5xx responses like the sync session does.
+
+        Unlike get, it raises MlbApiError once the retries of a 429 or 5xx response are spent.
+        """
+        url = self._url(path)
+        query = self._params(params, fields)
+
+        async def attempt():
+            async with self._async_host_semaphore(url):
+                response = await get_async_http_client().get(url, params=query)
+            if response.status_code in RETRY_STATUS_CODES:
+                raise MlbApiError(url, response.status_code, response.text,
+                                  parse_retry_after(response.headers.get("Retry-After")))
+            return response
+
+        return await retry_call_async(attempt, operation="mlb.get", retry_if=_is_retryable,
+                                      max_attempts=MLB_MAX_RETRIES + 1, base_delay=0.5)
+
+    async def get_json_async(self, path: str, params: Optional[dict] = None,
+                             fields: Optional[Iterable[str]] = None) -> dict:
+        """Async counterpart of get_json."""
+        response = await self.get_async(path, params, fields)
+        if not response.is_success:
+            raise MlbApiError(str(response.url), response.status_code, response.text)
+        return response.json()
+
+    def _url(self, path: str) -> str:
+        return urljoin(self.base_url, path.lstrip("/")) if "://" not in path else path
+
+    @staticmethod
+    def _params(params: Optional[dict], fields: Optional[Iterable[str]]) -> dict:
+        query = {key: value for key, value in (params or {}).items() if value is not None}
+        if fields:
+            query["fields"] = ",".join(fields)
+        return query
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.max_concurrent_requests)
+            return self._host_semaphores[host]
+
+    def _async_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        key = (asyncio.get_running_loop(), urlparse(url).netloc)
+        if key not in self._async_host_semaphores:
+            self._async_host_semaphores[key] = asyncio.Semaphore(self.max_concurrent_requests)
+        return self._async_host_semaphores[key]
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, MlbApiError):
+        return error.status_code in RETRY_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+mlb_client = MlbClient()
@@ -0,0 +1,209 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from apps.backend.api.highlight_store.team_timeline import rebuild_team_timeline
+from apps.backend.api.mlb_data_fetching.mlb_client import mlb_client
+from apps.backend.api.mlb_data_fetching.team_schedules_processor import process_games, is_final_game, \
+    get_current_datetime, MAX_GAMES_PER_COMMIT, SCHEDULE_PATH
+from apps.backend.utils.clients import get_firestore_client
+from apps.backend.utils.log_util import logger
+from apps.backend.utils.pubsub_utils import publish_batch
+
+# Days covered by one schedule request, a month of the full league schedule is a few hundred games
+SCHEDULE_RANGE_DAYS = 31
+# Regular season and postseason, spring training and exhibitions are left out
+DEFAULT_GAME_TYPES = "R,F,D,L,W"
+# Each batch is committed in one transaction
+BACKFILL_BATCH_SIZE = 100
+BACKFILL_MAX_WORKERS = 4
+SCHEDULE_FETCH_WORKERS = 4
+# Backfills started from the API run here one at a time, off the request thread
+backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backfill")
+_backfill_jobs: Dict[str, dict] = {}
+_backfill_jobs_lock = threading.Lock()
+
+
+def season_date_range(season: int, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> Tuple[date, date]:
+    """Resolves the backfill range, defaulting to the whole baseball calendar of the season up to today."""
+    start = _parse_date(start_date) if start_date else date(season, 3, 1)
+    end = _parse_date(end_date) if end_date else min(date(season, 11, 30), get_current_datetime().date())
+    if end < start:
+        raise ValueError(f"endDate {end} is before startDate {start}.")
+    return start, end
+
+
+def fetch_schedule_range(season: int, start: date, end: date, team_id: Optional[int] = None,
+                         game_types: str = DEFAULT_GAME_TYPES) -> List[dict]:
+    """Fetches every game between start and end with a few startDate/endDate schedule requests.
+
+    Games are deduplicated by gamePk: a game appears under both clubs when several teams are queried, and a
+    suspended game appears again on the date it is resumed, in which case its last appearance is kept.
+    """
+    ranges = []
+    range_start = start
+    while range_start <= end:
+        range_end = min(range_start + timedelta(days=SCHEDULE_RANGE_DAYS - 1), end)
+        ranges.append((range_start, range_end))
+        range_start = range_end + timedelta(days=1)
+
+    with ThreadPoolExecutor(max_workers=SCHEDULE_FETCH_WORKERS) as executor:
+        pages = list(executor.map(lambda date_range: _fetch_schedule_page(season, *date_range, team_id, game_types),
+                                  ranges))
+
+    games: Dict[int, dict] = {}
+    for page in pages:
+        for date_entry in page.get("dates", []):
+            for game in date_entry.get("games", []):
+                games[game["gamePk"]] = game
+    logger.info(f"Fetched {len(games)} games of season {season} from {start} to {end} in {len(ranges)} requests.")
+    return list(games.values())
+
+
+def _fetch_schedule_page(season, start: date, end: date, team_id, game_types) -> dict:
+    return mlb_client.get_json(SCHEDULE_PATH, params={
+        "sportId": 1, "season": season, "startDate": start.isoformat(), "endDate": end.isoformat(),
+        "gameType": game_types, "teamId": team_id,
+    })
+
+
+def backfill_season(season: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                    team_id: Optional[int] = None, batch_size: int = BACKFILL_BATCH_SIZE,
+                    max_workers: int = BACKFILL_MAX_WORKERS,
+                    on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Reprocesses every final game of a season (or of a date range) the way process_past_games does.
+
+    Games are processed in batches of one read and one commit each, at most max_workers batches at a time,
+    and the progress is reported after every batch. The batches leave the team timelines alone, since
+    concurrent batches would all contend for the same 30 documents: the timeline of every team they touched
+    is rebuilt once, after the last batch.
+
+    Args:
+        season: The season to backfill.
+        start_date: The first date to backfill (YYYY-MM-DD), defaults to March 1st.
+        end_date: The last date to backfill (YYYY-MM-DD), defaults to November 30th or today.
+        team_id: Restricts the backfill to the games of one team.
+        batch_size: The number of games read and committed together, at most MAX_GAMES_PER_COMMIT.
+        max_workers: The number of batches processed concurrently.
+        on_progress: Called with the progress report after every batch, in addition to logging it.
+
+    Returns:
+        The final progress report, with the gamePk of every processed and failed game and the rebuilt timelines.
+    """
+    start, end = season_date_range(season, start_date, end_date)
+    batch_size = max(1, min(batch_size, MAX_GAMES_PER_COMMIT))
+    started_at = time.monotonic()
+    games = [game for game in fetch_schedule_range(season, start, end, team_id) if is_final_game(game)]
+
+    current_date = get_current_datetime()
+    processed = []
+    failed = []
+    report = _progress_report(season, start, end, len(games), processed, failed, started_at)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batches = {executor.submit(_backfill_batch, games[batch_start:batch_start + batch_size], current_date):
+                   games[batch_start:batch_start + batch_size]
+                   for batch_start in range(0, len(games), batch_size)}
+        for future in as_completed(batches):
+            batch_pks = [str(game["gamePk"]) for game in batches[future]]
+            (processed if future.result() else failed).extend(batch_pks)
+
+            report = _progress_report(season, start, end, len(games), processed, failed, started_at)
+            logger.info(f"Backfill {season}: {report['done']}/{report['total']} games, {len(failed)} failed, "
+                        f"{report['gamesPerSecond']} games/s.")
+            if on_progress:
+                on_progress(report)
+
+    team_ids = sorted({game["teams"][side]["team"]["id"] for game in games for side in ("home", "away")})
+    db = get_firestore_client()
+    for team in team_ids:
+        rebuild_team_timeline(db, team)
+    return {**report, "processedHighlights": processed, "failedGames": failed, "rebuiltTimelines": team_ids}
+
+
+def _backfill_batch(games, current_date) -> bool:
+    try:
+        # Each batch waits for its own AI processing messages
+        with publish_batch():
+            process_games(games, current_date, [], update_timelines=False)
+        return True
+    except Exception as e:
+        logger.error(f"Error backfilling games {[game.get('gamePk') for game in games]}: {e}")
+        return False
+
+
+def start_backfill_job(season: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       team_id: Optional[int] = None) -> dict:
+    """Queues backfill_season on the backfill executor and returns its job, see get_backfill_job."""
+    job_id = uuid.uuid4().hex
+    job = {"jobId": job_id, "status": "queued", "season": season, "startDate": start_date, "endDate": end_date,
+           "teamId": team_id, "progress": None, "result": None, "error": None}
+    with _backfill_jobs_lock:
+        _backfill_jobs[job_id] = job
+
+    def run():
+        _update_backfill_job(job_id, status="running")
+        try:
+            result = backfill_season(season, start_date, end_date, team_id,
+                                     on_progress=lambda report: _update_backfill_job(job_id, progress=report))
+        except Exception as e:
+            logger.error(f"Backfill job {job_id} of season {season} failed: {e}")
+            _update_backfill_job(job_id, status="failed", error=str(e))
+        else:
+            _update_backfill_job(job_id, status="done", result=result)
+
+    backfill_executor.submit(run)
+    return get_backfill_job(job_id)
+
+
+def get_backfill_job(job_id: str) -> Optional[dict]:
+    """The status, progress and (once done) report of a backfill job started by this process, or None."""
+    with _backfill_jobs_lock:
+        job = _backfill_jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def _update_backfill_job(job_id: str, **changes):
+    with _backfill_jobs_lock:
+        _backfill_jobs[job_id].update(changes)
+
+
+def _progress_report(season, start, end, total, processed, failed, started_at) -> dict:
+    elapsed = time.monotonic() - started_at
+    done = len(processed) + len(failed)
+    return {
+        "season": season,
+        "startDate": start.isoformat(),
+        "endDate": end.isoformat(),
+        "total": total,
+        "done": done,
+        "processed": len(processed),
+        "failed": len(failed),
+        "elapsedSeconds": round(elapsed, 2),
+        "gamesPerSecond": round(done / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reprocesses the final games of a season.")
+    parser.add_argument("season", type=int)
+    parser.add_argument("--start-date")
+    parser.add_argument("--end-date")
+    parser.add_argument("--team-id", type=int)
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    parser.add_argument("--max-workers", type=int, default=BACKFILL_MAX_WORKERS)
+    args = parser.parse_args()
+
+    final_report = backfill_season(args.season, args.start_date, args.end_date, args.team_id,
+                                   batch_size=args.batch_size, max_workers=args.max_workers)
+    logger.info(f"Backfill finished: {final_report['processed']} processed, {final_report['failed']} failed "
+                f"in {final_report['elapsedSeconds']}s.")
@@ -1,24 +1,35 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
 
 import requests
 from flask import jsonify
-from google.cloud import firestore
 
-from apps.backend.config import PROJECT_ID, DATABASE_ID
-from apps.backend.utils.constants import ISO_FORMAT, MLB_SCHEDULE_API_BASE_URL, MLB_LOGOS_URL, MLB_STATS_API_BASE_URL
+from apps.backend.api.highlight_store.team_timeline import write_highlights
+from apps.backend.api.mlb_data_fetching.mlb_client import mlb_client, MlbApiError
+from apps.backend.utils.cache_utils import TTLCache, SingleFlight, invalidate_team_highlights
+from apps.backend.utils.clients import get_firestore_client
+from apps.backend.utils.constants import ISO_FORMAT, MLB_LOGOS_URL, SCHEDULE_CACHE_MAX_ENTRIES, \
+    SCHEDULE_CACHE_LIVE_TTL_SECONDS, SCHEDULE_CACHE_UPCOMING_TTL_SECONDS, \
+    SCHEDULE_CACHE_FINAL_TTL_SECONDS
 from apps.backend.utils.pubsub_utils import publish_game_status_event, trigger_ai_processing
 from apps.backend.utils.log_util import logger
 
-db = firestore.Client(
-    project=PROJECT_ID,  # Your Google Cloud project ID
-    database=DATABASE_ID
-)
+# Schedule responses keyed by (season, team_id, date), each with a TTL chosen by _schedule_ttl_seconds
+schedule_cache = TTLCache(max_entries=SCHEDULE_CACHE_MAX_ENTRIES, ttl_seconds=SCHEDULE_CACHE_UPCOMING_TTL_SECONDS)
+_schedule_fetches = SingleFlight()
+_async_schedule_fetches = {}
+# A transaction holds at most 500 writes, this leaves room for the timelines of every team
+MAX_GAMES_PER_COMMIT = 200
+SCHEDULE_PATH = "v1/schedule"
 
 
-def process_past_games(season, team_id, date):
-    """Processes finalized past games, updates status in Firestore, and triggers AI processing."""
+def process_past_games(season, team_id, date, schedule=None):
+    """Processes finalized past games, updates status in Firestore, and triggers AI processing.
+
+    A schedule already fetched by the caller (e.g. by the async API) is used instead of fetching it again.
+    """
     try:
-        data = _fetch_schedule(season, team_id, date)
+        data = schedule if schedule is not None else _fetch_schedule(season, team_id, date)
         if not data or "dates" not in data:
             logger.error(f"No data fetched for season {season}, date {date}, team {team_id}.")
             return []
@@ -37,10 +48,10 @@ def process_past_games(season, team_id, date):
 
 
 # Checks for upcoming games & sends pubsub message
-def check_next_game(season, team_id, date):
+def check_next_game(season, team_id, date, schedule=None):
     """Finds the next upcoming game within the next 7 days and stores it in the 'highlights' collection."""
     try:
-        data = _fetch_schedule(season, team_id, date)
+        data = schedule if schedule is not None else _fetch_schedule(season, team_id, date)
         if not data or "dates" not in data:
             logger.error(f"No schedule data found for team {team_id}, season {season}.")
             return None
@@ -54,7 +65,7 @@ def check_next_game(season, team_id, date):
 
                 if current_date < game_date <= current_date + timedelta(days=7):
                     game_pk = str(game["gamePk"])
-                    doc_ref = db.collection("highlights").document(game_pk)
+                    doc_ref = get_firestore_client().collection("highlights").document(game_pk)
 
                     # Check if game already exists in Firestore
                     if not doc_ref.get().exists:
@@ -84,50 +95,64 @@ def check_next_game(season, team_id, date):
 
 
 def _loop_over_game_dates(data, current_date, highlights):
-    """Process each game in the schedule data."""
-    for date_entry in data["dates"]:
-        for game in date_entry["games"]:
-            if _is_final_game(game):
-                game_pk_str = str(game["gamePk"])
-                _process_game(game, game_pk_str, current_date, highlights)
+    """Process the final games of the schedule data together, see process_games."""
+    final_games = [game for date_entry in data["dates"] for game in date_entry["games"] if is_final_game(game)]
+    for chunk_start in range(0, len(final_games), MAX_GAMES_PER_COMMIT):
+        process_games(final_games[chunk_start:chunk_start + MAX_GAMES_PER_COMMIT], current_date, highlights)
 
 
-def _is_final_game(game):
+def is_final_game(game):
     """Check if a game is in Final state."""
     return game["status"].get("abstractGameState", "") == "Final"
 
 
-def _process_game(game, game_pk_str, current_date, highlights):
-    """Process a single game and update Firestore."""
-    doc_ref = db.collection("highlights").document(game_pk_str)
-    doc_snapshot = doc_ref.get()
-
-    if doc_snapshot.exists:
-        _update_existing_game(doc_ref, doc_snapshot, game_pk_str, current_date)
-    else:
-        _create_new_game(doc_ref, game, game_pk_str, current_date)
-
-    highlights.append(game_pk_str)
-
-
-def _update_existing_game(doc_ref, doc_snapshot, game_pk_str, current_date):
-    """Update an existing game if its status has changed to Final."""
-    stored_data = doc_snapshot.to_dict()
+def process_games(games, current_date, highlights, update_timelines=True):
+    """Process final games and update Firestore together with their teams' timelines.
+
+    Every game is read with one get_all, its create or update is worked out in memory, and all the writes
+    are committed in one transaction, instead of a read and a write per game. Without update_timelines the
+    timelines are left to the caller, e.g. a backfill rebuilding them once at the end.
+    """
+    games = {str(game["gamePk"]): game for game in games}
+    if not games:
+        return
+
+    def build_write(game, game_pk_str):
+        def builder(stored_data):
+            if stored_data is not None:
+                return _update_existing_game(stored_data, current_date)
+            return _create_new_game(game, game_pk_str, current_date)
+        return builder
+
+    results = write_highlights(get_firestore_client(),
+                               {game_pk_str: build_write(game, game_pk_str) for game_pk_str, game in games.items()},
+                               update_timelines)
+
+    team_ids = set()
+    for game_pk_str, (stored_data, written) in results.items():
+        if written is None:
+            logger.info(f"Game {game_pk_str} already marked Final, skipping update.")
+        else:
+            logger.info(f"{'Updated game' if stored_data else 'Inserted new game'} {game_pk_str} as Final in Firestore.")
+            trigger_ai_processing(game_pk_str)
+        teams = games[game_pk_str]["teams"]
+        team_ids.update((teams["home"]["team"]["id"], teams["away"]["team"]["id"]))
+        highlights.append(game_pk_str)
+
+    invalidate_team_highlights(*team_ids)
+
+
+def _update_existing_game(stored_data, current_date):
+    """Build the update of an existing game if its status has changed to Final."""
     if stored_data.get("status") != "Final":
-        doc_ref.update({"status": "Final", "updatedAt": current_date})
-        logger.info(f"Updated game {game_pk_str} to Final in Firestore.")
-        trigger_ai_processing(game_pk_str)
-    else:
-        logger.info(f"Game {game_pk_str} already marked Final, skipping update.")
+        return "update", {"status": "Final", "updatedAt": current_date}
+    return None
 
 
-def _create_new_game(doc_ref, game, game_pk_str, current_date):
-    """Create a new game record in Firestore."""
+def _create_new_game(game, game_pk_str, current_date):
+    """Build a new game record for Firestore."""
     game_date = get_game_datetime(game)
-    highlight = _create_new_highlight_record(game_pk_str, game_date, game, current_date)
-    doc_ref.set(highlight)
-    logger.info(f"Inserted new game {game_pk_str} in Firestore.")
-    trigger_ai_processing(game_pk_str)
+    return "set", _create_new_highlight_record(game_pk_str, game_date, game, current_date)
 
 
 def _create_new_highlight_record(game_pk_str=None, game_date=None, game=None, current_date=None):
@@ -146,16 +171,85 @@ def _get_team_logo_url(team_id):
     return f"{MLB_LOGOS_URL}{team_id}.svg"
 
 
-# Function to construct the team logo URL
 def _fetch_schedule(season, team_id, date):
-    """Fetches schedule data from MLB Stats API, filtering by required date and optional team."""
-    url = f"{MLB_SCHEDULE_API_BASE_URL}?sportId=1&season={season}&teamId={team_id}&date={date}"
+    """Fetches schedule data from MLB Stats API, filtering by required date and optional team.
+
+    Responses are cached per query for as long as the state of their games allows, and concurrent fetches
+    of the same query share a single upstream request.
+    """
+    cache_key = _schedule_cache_key(season, team_id, date)
+    data = schedule_cache.get(cache_key)
+    if data is not None:
+        return data
+    return _schedule_fetches.do(cache_key, lambda: _fetch_and_cache_schedule(cache_key))
+
+
+def _fetch_and_cache_schedule(cache_key):
+    # Another caller may have stored the schedule while this one waited to lead the fetch
+    data = schedule_cache.get(cache_key)
+    if data is not None:
+        return data
+    response = mlb_client.get(SCHEDULE_PATH, params=_schedule_params(*cache_key))
+    if response.status_code != 200:
+        logger.error(f"Error fetching schedule: {response.text}")
+        return None
+    data = response.json()
+    schedule_cache.set(cache_key, data, ttl_seconds=_schedule_ttl_seconds(data))
+    return data
+
+
+async def fetch_schedule_async(season, team_id, date):
+    """Async counterpart of _fetch_schedule, used by the ASGI API. It shares the schedule cache."""
+    cache_key = _schedule_cache_key(season, team_id, date)
+    data = schedule_cache.get(cache_key)
+    if data is not None:
+        return data
+
+    pending = _async_schedule_fetches.get(cache_key)
+    if pending is None:
+        pending = asyncio.ensure_future(_fetch_and_cache_schedule_async(cache_key))
+        _async_schedule_fetches[cache_key] = pending
+        pending.add_done_callback(lambda _: _async_schedule_fetches.pop(cache_key, None))
+    # Shielded so a cancelled request does not cancel the fetch other requests wait on
+    return await asyncio.shield(pending)
 
-    response = requests.get(url)
+
+async def _fetch_and_cache_schedule_async(cache_key):
+    try:
+        response = await mlb_client.get_async(SCHEDULE_PATH, params=_schedule_params(*cache_key))
+    except MlbApiError as e:
+        logger.error(f"Error fetching schedule: {e}")
+        return None
     if response.status_code != 200:
         logger.error(f"Error fetching schedule: {response.text}")
         return None
-    return response.json()
+    data = response.json()
+    schedule_cache.set(cache_key, data, ttl_seconds=_schedule_ttl_seconds(data))
+    return data
+
+
+def _schedule_ttl_seconds(data):
+    """Picks how long a schedule stays cached from the state of its games.
+
+    A schedule with a live game changes every few seconds, one whose games are all final never changes
+    again, anything else (upcoming or postponed games) changes only when MLB reschedules.
+    """
+    states = [game["status"].get("abstractGameState", "")
+              for date_entry in data.get("dates", [])
+              for game in date_entry.get("games", [])]
+    if "Live" in states:
+        return SCHEDULE_CACHE_LIVE_TTL_SECONDS
+    if states and all(state == "Final" for state in states):
+        return SCHEDULE_CACHE_FINAL_TTL_SECONDS
+    return SCHEDULE_CACHE_UPCOMING_TTL_SECONDS
+
+
+def _schedule_cache_key(season, team_id, date):
+    return str(season), str(team_id) if team_id else None, str(date)
+
+
+def _schedule_params(season, team_id, date):
+    return {"sportId": 1, "season": season, "teamId": team_id, "date": date}
 
 
 def get_current_datetime():
@@ -167,11 +261,8 @@ def get_game_datetime(game):
 
 
 def _get_teams_from_api():
-    teams_endpoint_url = f"{MLB_STATS_API_BASE_URL}v1/teams?sportId=1"
     try:
-        response = requests.get(teams_endpoint_url)
-        response.raise_for_status()
-        data = response.json()
+        data = mlb_client.get_json("v1/teams", params={"sportId": 1})
 
         teams = []
         for team in data["teams"]:
@@ -185,5 +276,5 @@ def _get_teams_from_api():
 
         teams_sorted = sorted(teams, key=lambda x: x['name'])
         return jsonify(teams_sorted)
-    except requests.exceptions.RequestException as e:
+    except (MlbApiError, requests.exceptions.RequestException) as e:
         return jsonify({"error": str(e)}, 500)
@@ -0,0 +1,127 @@
+"""Import-time (cold start) benchmark for the backend entry points.
+
+Every target is imported in a fresh interpreter, the way a Cloud Function or Cloud Run instance starts.
+For each one it reports the median import time, checks it against a budget, and checks that none of the
+heavy SDKs the target does not need were imported. It exits with status 1 when a budget or import rule is
+broken.
+
+Usage:
+    python -m apps.backend.benchmarks.import_time [--repeat 5] [--top 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+CLOUD_FUNCTIONS_DIR = REPO_ROOT / "apps" / "backend" / "cloud-functions"
+
+# SDKs that cost hundreds of milliseconds to import
+HEAVY_SDKS = [
+    "vertexai",
+    "google.cloud.aiplatform",
+    "google.generativeai",
+    "google.cloud.texttospeech_v1beta1",
+    "google.cloud.secretmanager",
+    "google.cloud.storage",
+    "google.cloud.pubsub_v1",
+    "google.cloud.firestore",
+]
+GENERATION_SDKS = HEAVY_SDKS[:5]
+
+# (name, statement importing the target, budget in ms, modules it must not import)
+TARGETS = [
+    ("process-game-status-event",
+     f"import runpy; runpy.run_path({str(CLOUD_FUNCTIONS_DIR / 'process-game-status-event' / 'main.py')!r})",
+     1000, HEAVY_SDKS),
+    ("ai-processing-service",
+     f"import runpy; runpy.run_path({str(CLOUD_FUNCTIONS_DIR / 'ai-processing-service' / 'main.py')!r})",
+     1000, HEAVY_SDKS),
+    ("api.main", "import apps.backend.api.main", 4000, GENERATION_SDKS),
+]
+
+# Runs in the child interpreter, prints the elapsed time and the heavy modules that ended up loaded
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed_ms = (time.perf_counter() - start) * 1000
+loaded = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"elapsed_ms": elapsed_ms, "loaded": loaded}}))
+"""
+
+
+def _child_env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    # config.py refuses to load without these, their values do not matter for an import
+    for name, value in (("GOOGLE_CLOUD_PROJECT_ID", "benchmark"), ("GCS_BUCKET", "gs://benchmark"),
+                        ("GEMINI_API_KEY", "benchmark")):
+        env.setdefault(name, value)
+    return env
+
+
+def measure(statement: str, importtime: bool = False) -> dict:
+    """Imports a target once in a fresh interpreter."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", CHILD_SCRIPT.format(statement=statement, heavy=HEAVY_SDKS)]
+    completed = subprocess.run(command, capture_output=True, text=True, env=_child_env(), cwd=REPO_ROOT)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "import failed")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if importtime:
+        result["slowest"] = _slowest_imports(completed.stderr)
+    return result
+
+
+def _slowest_imports(importtime_output: str) -> list:
+    """Parses -X importtime output into the (cumulative ms, module) of the top-level imports, slowest first."""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _, fields = line.partition(":")
+        _self_us, cumulative_us, name = fields.split("|")
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(" "):
+            imports.append((int(cumulative_us) / 1000, name.strip()))
+    return sorted(imports, reverse=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per target, the median is reported.")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per target.")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for name, statement, budget_ms, forbidden in TARGETS:
+        try:
+            runs = [measure(statement) for _ in range(args.repeat)]
+            profile = measure(statement, importtime=True)
+        except RuntimeError as e:
+            print(f"{name}: could not be imported - {e}")
+            failures.append(name)
+            continue
+
+        median_ms = statistics.median(run["elapsed_ms"] for run in runs)
+        unexpected = [module for module in runs[-1]["loaded"] if module in forbidden]
+        within_budget = median_ms <= budget_ms
+        print(f"{name}: {median_ms:.0f} ms (budget {budget_ms} ms) {'OK' if within_budget else 'OVER BUDGET'}")
+        if unexpected:
+            print(f"  imports SDKs it does not need: {', '.join(unexpected)}")
+        for cumulative_ms, module in profile["slowest"][:args.top]:
+            print(f"  {cumulative_ms:8.1f} ms  {module}")
+        if not within_budget or unexpected:
+            failures.append(name)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
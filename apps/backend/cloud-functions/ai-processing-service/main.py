@@ -4,19 +4,37 @@ import os
 
 import functions_framework
 import requests
-from google.auth import default
-from google.cloud import firestore
 
-from apps.backend.config import PROJECT_ID, DATABASE_ID
-
-db = firestore.Client(
-    project=PROJECT_ID,
-    database=DATABASE_ID
-)
+from apps.backend.utils.clients import get_firestore_client
+from apps.backend.utils.constants import AI_PROCESSING_CONNECT_TIMEOUT_SECONDS, AI_PROCESSING_READ_TIMEOUT_SECONDS
+from apps.backend.utils.retry_utils import retry_call, parse_retry_after
 
 API_BASE_URL = os.getenv("SLIME_API_BASE_URL")
-# Automatically retrieves the best available credentials
-credentials, project = default()
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ApiCallError(Exception):
+    def __init__(self, status_code, text, retry_after=None):
+        super().__init__(f"API call failed with status {status_code}: {text}")
+        self.status_code = status_code
+        # Honoured by retry_call, e.g. the Retry-After of a rate limited generation
+        self.retry_after = retry_after
+
+
+def _generate_highlights(game_pk):
+    """Calls the Flask API endpoint."""
+    response = requests.get(f"{API_BASE_URL}highlights/generate/{game_pk}",
+                            timeout=(AI_PROCESSING_CONNECT_TIMEOUT_SECONDS, AI_PROCESSING_READ_TIMEOUT_SECONDS))
+    if response.status_code != 200:
+        raise ApiCallError(response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After")))
+    return response
+
+
+def _is_retryable(error):
+    if isinstance(error, ApiCallError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    # A generation that outlived the read timeout would not finish within the function's timeout on a retry
+    return isinstance(error, requests.RequestException) and not isinstance(error, requests.Timeout)
 
 
 @functions_framework.cloud_event
@@ -35,31 +53,22 @@ def ai_processing_service(cloud_event):
 
         print(f"Starting AI processing for game {game_pk}...")
 
-        # Firestore update with retry logic
-        max_retries = 3
-        for attempt in range(1, max_retries + 1):
-            try:
-                # Call the Flask API endpoint
-                response = requests.get(f"{API_BASE_URL}highlights/generate/{game_pk}")
-
-                if response.status_code != 200:
-                    raise Exception(f"API call failed with status {response.status_code}: {response.text}")
-
-                print(f"AI processing complete for game {game_pk}. API call successful.")
-                return {"message": f"AI processing complete for game {game_pk}"}
-
-            except Exception as e:
-                print(f"Attempt {attempt}: Failed to process game {game_pk}. Error: {e}")
-                if attempt < max_retries:
-                    continue  # Retry
-                else:
-                    print(f"Processing failed after {max_retries} attempts. Logging error.")
-                    db.collection("failed_ai_updates").document(str(game_pk)).set({
-                        "gamePk": str(game_pk),
-                        "error": str(e),
-                        "timestamp": firestore.SERVER_TIMESTAMP
-                    })
-                    return {"error": f"Failed to process game {game_pk}"}
+        # Calls the API with jittered exponential backoff, rate limits and server errors are retried
+        try:
+            retry_call(_generate_highlights, game_pk, operation="ai-processing.generate", retry_if=_is_retryable,
+                       max_attempts=3, base_delay=10, max_delay=60)
+            print(f"AI processing complete for game {game_pk}. API call successful.")
+            return {"message": f"AI processing complete for game {game_pk}"}
+
+        except Exception as e:
+            print(f"Processing failed for game {game_pk}. Logging error. Error: {e}")
+            from google.cloud import firestore
+            get_firestore_client().collection("failed_ai_updates").document(str(game_pk)).set({
+                "gamePk": str(game_pk),
+                "error": str(e),
+                "timestamp": firestore.SERVER_TIMESTAMP
+            })
+            return {"error": f"Failed to process game {game_pk}"}
 
     except Exception as e:
         print(f"Error processing AI assets: {e}")
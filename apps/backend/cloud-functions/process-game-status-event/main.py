@@ -1,27 +1,71 @@
 import base64
 import json
+from concurrent import futures
 
 import functions_framework
-import requests
-from google.auth import default
-from google.cloud import firestore, pubsub_v1
 
-db = firestore.Client(
-    project = "slimeify",  # Your Google Cloud project ID
-    database = "mlb-sluggers"
-)
+from apps.backend.api.mlb_data_fetching.mlb_client import mlb_client
 
-# Initialize Pub/Sub Publisher
-publisher = pubsub_v1.PublisherClient()
-game_status_topic_path = publisher.topic_path("slimeify", "sluggers-process-game-status")
-ai_processing_topic = publisher.topic_path("slimeify", "sluggers-ai-processing")
+# Topic paths are plain strings, no client is needed to build them
+game_status_topic_path = "projects/slimeify/topics/sluggers-process-game-status"
+ai_processing_topic = "projects/slimeify/topics/sluggers-ai-processing"
+
+GAME_FEED_PATH = "v1.1/game/{game_pk}/feed/live"
+# Only the game state is needed, not the whole GUMBO feed
+MLB_STATUS_FIELDS = ["gameData", "status", "abstractGameState"]
+
+# Clients are built on the first invocation that needs them, not on every cold start.
+# Most invocations find the game still in progress and never touch Firestore or Pub/Sub.
+_db = None
+_publisher = None
+
+
+def get_db():
+    global _db
+    if _db is None:
+        from google.cloud import firestore
+        _db = firestore.Client(
+            project = "slimeify",  # Your Google Cloud project ID
+            database = "mlb-sluggers"
+        )
+    return _db
+
+
+def get_publisher():
+    global _publisher
+    if _publisher is None:
+        from google.cloud import pubsub_v1
+        _publisher = pubsub_v1.PublisherClient(batch_settings=pubsub_v1.types.BatchSettings(
+            max_messages=100, max_bytes=1024 * 1024, max_latency=0.05))
+    return _publisher
+
+
+def publish(topic, message, description, pending):
+    """Publishes without waiting, the invocation waits for every message it queued once, before returning."""
+    future = get_publisher().publish(topic, json.dumps(message).encode("utf-8"))
+    future.add_done_callback(lambda done: _log_publish(done, description))
+    pending.append(future)
+
+
+def _log_publish(future, description):
+    try:
+        print(f"{description}, Message ID: {future.result()}")
+    except Exception as e:
+        print(f"Failed to publish Pub/Sub message ({description}). Error: {e}")
+
+
+def flush(pending, timeout=30):
+    """Waits for the queued messages, an instance may be throttled as soon as the invocation returns."""
+    if pending:
+        _, not_done = futures.wait(pending, timeout=timeout)
+        if not_done:
+            print(f"{len(not_done)} Pub/Sub messages were not published within {timeout}s.")
 
-# Automatically retrieves the best available credentials
-credentials, project = default()
 
 @functions_framework.cloud_event
 def process_game_status_event(cloud_event):
     """Triggered by a Pub/Sub message to check game status from the MLB API."""
+    pending = []
     try:
         # Decode and parse the Pub/Sub message safely
         message_data = cloud_event.data.get("message", {}).get("data", "")
@@ -36,26 +80,18 @@ def process_game_status_event(cloud_event):
 
         print(f"Checking status for game {game_pk}...")
 
-        # Fetch game status from MLB API
-        mlb_url = f"https://statsapi.mlb.com/api/v1.1/game/{game_pk}/feed/live"
-        response = requests.get(mlb_url)
-
-        if response.status_code != 200:
-            raise ValueError(f"MLB API request failed: {response.text}")
-
-        game_data = response.json()
+        # Fetch game status from MLB API, the shared client retries 429 and 5xx and raises once they are spent
+        game_data = mlb_client.get_json(GAME_FEED_PATH.format(game_pk=game_pk), fields=MLB_STATUS_FIELDS)
         game_status = game_data["gameData"]["status"]["abstractGameState"]
 
         if game_status == "Final":
             print(f"Game {game_pk} is Final. Updating Firestore and triggering AI processing.")
 
             # Update Firestore to mark the game as Final
-            db.collection("highlights").document(str(game_pk)).update({"status": "Final"})
+            get_db().collection("highlights").document(str(game_pk)).update({"status": "Final"})
 
             # Publish message to AI Processing Pub/Sub topic
-            ai_message = json.dumps({"gamePk": game_pk}).encode("utf-8")
-            future = publisher.publish(ai_processing_topic, ai_message)
-            print(f"AI Processing triggered for game {game_pk}, Message ID: {future.result()}")
+            publish(ai_processing_topic, {"gamePk": game_pk}, f"AI Processing triggered for game {game_pk}", pending)
 
             return {"message": f"Game {game_pk} is Final. AI processing started."}, 200
         else:
@@ -64,3 +100,5 @@ def process_game_status_event(cloud_event):
     except Exception as e:
         print(f"Error processing game status: {e}")
         return {"error": str(e)}, 500
+    finally:
+        flush(pending)
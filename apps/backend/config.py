@@ -1,7 +1,6 @@
 import os
 
 from dotenv import load_dotenv
-from google.cloud import secretmanager
 
 
 def get_credentials_from_secret_manager(project_id, secret_name):
@@ -14,6 +13,8 @@ def get_credentials_from_secret_manager(project_id, secret_name):
     Returns:
         A dictionary containing the credentials, or None if an error occurs.
     """
+    # Imported here so that importing config does not load the Secret Manager SDK
+    from google.cloud import secretmanager
 
     client = secretmanager.SecretManagerServiceClient()
     name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
@@ -23,6 +23,14 @@ setup(
         'google-cloud-texttospeech',
         'google-cloud-aiplatform',
         'google-cloud-pubsub',
+        'brotli',
+        'zstandard',
+        'ijson',
+        'numpy',
+        'starlette',
+        'uvicorn',
+        'httpx',
+        'asgiref',
     ],
     entry_points={
         'console_scripts': [
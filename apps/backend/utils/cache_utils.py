@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+from apps.backend.utils.constants import HIGHLIGHTS_CACHE_MAX_ENTRIES, HIGHLIGHTS_CACHE_TTL_SECONDS
+from apps.backend.utils.log_util import logger
+
+
+class TTLCache:
+    """A thread-safe, size-capped LRU cache whose entries expire after a time-to-live.
+
+    Args:
+        max_entries: The maximum number of entries kept before the least recently used one is evicted.
+        ttl_seconds: How long an entry stays valid after it is stored.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value for key, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Stores value under key, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key: The cache key.
+            value: The value to cache.
+            ttl_seconds: Overrides the cache's time-to-live for this entry.
+        """
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drops every entry whose key matches the predicate and returns how many were dropped."""
+        with self._lock:
+            stale_keys = [key for key in self._entries if predicate(key)]
+            for key in stale_keys:
+                del self._entries[key]
+            return len(stale_keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and current size of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one call whose result they all share."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not is_leader:
+            return call.result()
+
+        try:
+            result = func()
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+# Serialized GET /highlights/<team_id> responses, keyed by (team_id, ...)
+highlights_cache = TTLCache(max_entries=HIGHLIGHTS_CACHE_MAX_ENTRIES, ttl_seconds=HIGHLIGHTS_CACHE_TTL_SECONDS)
+# Bumped on every invalidation so a read that raced a write does not cache a stale feed
+_team_generations = {}
+_team_generations_lock = threading.Lock()
+
+
+def get_team_highlights_generation(team_id) -> int:
+    with _team_generations_lock:
+        return _team_generations.get(int(team_id), 0)
+
+
+def cache_team_highlights(key: tuple, value: Any, generation: int):
+    """Caches a team feed unless the team was invalidated since the feed was read."""
+    with _team_generations_lock:
+        if _team_generations.get(int(key[0]), 0) == generation:
+            highlights_cache.set(key, value)
+
+
+def invalidate_team_highlights(*team_ids):
+    """Drops the cached highlight feeds of every team touched by a write."""
+    team_ids = {int(team_id) for team_id in team_ids if isinstance(team_id, (int, str)) and str(team_id).isdigit()}
+    if not team_ids:
+        return
+    with _team_generations_lock:
+        for team_id in team_ids:
+            _team_generations[team_id] = _team_generations.get(team_id, 0) + 1
+        dropped = highlights_cache.invalidate_where(lambda key: key[0] in team_ids)
+    logger.debug(f"Invalidated {dropped} cached highlight feeds for teams {sorted(team_ids)}.")
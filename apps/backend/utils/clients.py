@@ -0,0 +1,86 @@
+"""Lazily-initialized clients shared by every module of the backend.
+
+Nothing here is built, and no heavy SDK is imported, until the first call of a getter, so importing a
+module costs only what the code path actually using it needs.
+"""
+import functools
+import threading
+
+
+def lazy_client(factory):
+    """Turns a zero-argument factory into a getter that builds its client once, on first use."""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def getter():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    getter.is_initialized = lambda: bool(instance)
+    return getter
+
+
+@lazy_client
+def get_firestore_client():
+    from google.cloud import firestore
+
+    from apps.backend.config import PROJECT_ID, DATABASE_ID
+    return firestore.Client(project=PROJECT_ID, database=DATABASE_ID)
+
+
+@lazy_client
+def get_async_firestore_client():
+    from google.cloud import firestore
+
+    from apps.backend.config import PROJECT_ID, DATABASE_ID
+    return firestore.AsyncClient(project=PROJECT_ID, database=DATABASE_ID)
+
+
+@lazy_client
+def get_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+
+@lazy_client
+def get_publisher_client():
+    from google.cloud import pubsub_v1
+
+    from apps.backend.utils.constants import PUBSUB_BATCH_MAX_MESSAGES, PUBSUB_BATCH_MAX_BYTES, \
+        PUBSUB_BATCH_MAX_LATENCY_SECONDS
+    return pubsub_v1.PublisherClient(batch_settings=pubsub_v1.types.BatchSettings(
+        max_messages=PUBSUB_BATCH_MAX_MESSAGES,
+        max_bytes=PUBSUB_BATCH_MAX_BYTES,
+        max_latency=PUBSUB_BATCH_MAX_LATENCY_SECONDS,
+    ))
+
+
+@lazy_client
+def get_tts_client():
+    # v1beta1, for the SSML mark timepoints of batched synthesis
+    from google.cloud import texttospeech_v1beta1
+    return texttospeech_v1beta1.TextToSpeechClient()
+
+
+@lazy_client
+def init_vertex_ai():
+    """Initializes Vertex AI (and the aiplatform SDK it wraps) once per process."""
+    import vertexai
+
+    from apps.backend.config import PROJECT_ID, REGION, BUCKET_URI
+    vertexai.init(project=PROJECT_ID, location=REGION, staging_bucket=BUCKET_URI)
+    return True
+
+
+@lazy_client
+def configure_genai():
+    """Configures the Gemini SDK with the API key once per process and returns the module."""
+    import google.generativeai as genai
+
+    from apps.backend.config import GEMINI_API_KEY
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
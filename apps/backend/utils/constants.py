@@ -2,6 +2,71 @@ MLB_STATS_API_BASE_URL = "https://statsapi.mlb.com/api/"
 MLB_SCHEDULE_API_BASE_URL = f"{MLB_STATS_API_BASE_URL}v1/schedule"
 MLB_LOGOS_URL = "https://www.mlbstatic.com/team-logos/"
 ISO_FORMAT = "+00:00"
+# MLB Stats API calls, GUMBO feeds of long games take a few seconds to download
+MLB_CONNECT_TIMEOUT_SECONDS = 3.05
+MLB_READ_TIMEOUT_SECONDS = 30
+MLB_MAX_RETRIES = 3
+MLB_MAX_CONCURRENT_REQUESTS = 16
+# Stored GUMBO feeds, /tmp is the only writable (in-memory) disk on Cloud Run
+GUMBO_STORE_DIR = "/tmp/sluggers/gumbo-feeds"
+GUMBO_STORE_MAX_LOCAL_FEEDS = 200
+HIGHLIGHTS_CACHE_MAX_ENTRIES = 256
+HIGHLIGHTS_CACHE_TTL_SECONDS = 300
+# Schedule responses are cached for as long as the state of their games allows
+SCHEDULE_CACHE_MAX_ENTRIES = 1024
+SCHEDULE_CACHE_LIVE_TTL_SECONDS = 30
+SCHEDULE_CACHE_UPCOMING_TTL_SECONDS = 5 * 60
+SCHEDULE_CACHE_FINAL_TTL_SECONDS = 24 * 60 * 60
+# Publishes are sent together once one of these limits is reached
+PUBSUB_BATCH_MAX_MESSAGES = 100
+PUBSUB_BATCH_MAX_BYTES = 1024 * 1024
+PUBSUB_BATCH_MAX_LATENCY_SECONDS = 0.05
+PUBSUB_FLUSH_TIMEOUT_SECONDS = 30
+# Jittered exponential backoff shared by retry_utils
+RETRY_MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY_SECONDS = 1
+RETRY_MAX_DELAY_SECONDS = 30
+RETRY_WORKERS = 4
+# Sent with 429 responses of highlight generation, Gemini and Imagen quotas refill per minute
+GENERATION_RETRY_AFTER_SECONDS = 60
+# ai-processing-service calls to the generate endpoint, read well within the function's 300s timeout
+AI_PROCESSING_CONNECT_TIMEOUT_SECONDS = 10
+AI_PROCESSING_READ_TIMEOUT_SECONDS = 240
+# The story prompt gets the top-k key moments of a game, each with the plays around it
+KEY_MOMENTS_TOP_K = 24
+KEY_MOMENTS_CONTEXT_PLAYS = 1
+# The plays table of the story prompt is trimmed to this many (estimated) tokens
+STORY_PROMPT_PLAY_TOKEN_BUDGET = 4000
+PROMPT_CHARS_PER_TOKEN = 4
+# Gemini results of identical prompts are reused for this long
+GENERATION_CACHE_MAX_ENTRIES = 128
+GENERATION_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+# Concurrent Imagen and TTS calls of the scene assets, per process
+SCENE_IMAGE_CONCURRENCY = 4
+SCENE_AUDIO_CONCURRENCY = 8
+# Calls per minute of each rate-limited backend (or backend family), the quotas of the project
+RATE_LIMITS_PER_MINUTE = {
+    "gemini.story": 10,
+    "gemini.imagen-prompts": 10,
+    "imagen3": 20,
+    "tts": 300,
+}
+RATE_LIMIT_BURST_SECONDS = 5
+RATE_LIMIT_MAX_ATTEMPTS = 5
+# Images Imagen generates per request (the first is used) and the age under which the sweeper keeps one
+IMAGEN_VARIANT_COUNT = 1
+GENERATED_IMAGE_SWEEP_MIN_AGE_SECONDS = 24 * 60 * 60
+# Scene images are reused for prompts at least this similar (cosine of hashed n-grams), above 1 disables reuse
+IMAGE_REUSE_SIMILARITY_THRESHOLD = 0.9
+PROMPT_INDEX_DIR = "/tmp/sluggers/prompt-index"
+PROMPT_INDEX_DIMENSIONS = 1024
+PROMPT_INDEX_MAX_ENTRIES = 8192
+# The audio of an act's scenes is synthesized in one request per language, split at SSML marks
+TTS_BATCH_BY_ACT = True
+# The SSML input limit of a TTS request
+TTS_MAX_SSML_BYTES = 5000
+# Storyboards whose scenes serialize larger than this keep them in a compressed GCS object
+SCENES_OFFLOAD_BYTES = 256 * 1024
 TEAMS = [
                 {
                     "logoUrl": "https://www.mlbstatic.com/team-logos/109.svg",
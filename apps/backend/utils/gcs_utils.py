@@ -1,15 +1,15 @@
-from typing import Any
+from typing import Any, Iterator, List
 
-from google.cloud import storage
 import io
 
+from apps.backend.utils.clients import get_storage_client
 from apps.backend.utils.log_util import logger
 
 
 def upload_blob_from_stream(bucket_name: str, destination_blob_name: str, content: Any):
     """Uploads bytes from a stream or other file-like object to a blob."""
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(destination_blob_name)
         logger.debug("blob is %s", f"{blob}")
@@ -28,9 +28,59 @@ def upload_blob_from_stream(bucket_name: str, destination_blob_name: str, conten
 
 def upload_blob_from_memory(bucket_name: str, contents: str, destination_blob_name: str):
     """Uploads a file to the bucket."""
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
     blob.upload_from_string(contents)
     logger.info(f"{destination_blob_name} with contents {contents} uploaded to {bucket_name}.")
     return blob.public_url
+
+
+def upload_bytes(bucket_name: str, destination_blob_name: str, data: bytes, content_type: str) -> str:
+    """Uploads raw bytes to a blob and returns its gs:// URI."""
+    storage_client = get_storage_client()
+    blob = storage_client.bucket(bucket_name).blob(destination_blob_name)
+    blob.upload_from_string(data, content_type=content_type)
+    logger.info(f"Uploaded {len(data)} bytes to gs://{bucket_name}/{destination_blob_name}.")
+    return f"gs://{bucket_name}/{destination_blob_name}"
+
+
+def download_bytes(gcs_uri: str) -> bytes:
+    """Downloads the raw bytes of a gs:// URI."""
+    bucket_name, _, blob_name = gcs_uri.replace("gs://", "", 1).partition("/")
+    storage_client = get_storage_client()
+    return storage_client.bucket(bucket_name).blob(blob_name).download_as_bytes()
+
+
+def delete_blob(gcs_uri: str):
+    """Deletes the blob of a gs:// URI."""
+    bucket_name, _, blob_name = gcs_uri.replace("gs://", "", 1).partition("/")
+    storage_client = get_storage_client()
+    storage_client.bucket(bucket_name).blob(blob_name).delete()
+
+
+def list_blob_names(bucket_name: str, prefix: str) -> List[str]:
+    """Lists the names of the blobs whose name starts with prefix."""
+    storage_client = get_storage_client()
+    return [blob.name for blob in storage_client.list_blobs(bucket_name, prefix=prefix)]
+
+
+def list_blobs(bucket_name: str, prefix: str = "") -> Iterator[Any]:
+    """Lists the blobs whose name starts with prefix, with their metadata (size, updated, ...)."""
+    storage_client = get_storage_client()
+    return storage_client.list_blobs(bucket_name, prefix=prefix)
+
+
+def list_prefixes(bucket_name: str, prefix: str = "") -> List[str]:
+    """Lists the "directories" right under prefix, e.g. ["generated-images/"] for the bucket's root."""
+    storage_client = get_storage_client()
+    blobs = storage_client.list_blobs(bucket_name, prefix=prefix, delimiter="/")
+    # The prefixes are only known once every page was read
+    for _ in blobs:
+        pass
+    return sorted(blobs.prefixes)
+
+
+def blob_exists(bucket_name: str, blob_name: str) -> bool:
+    storage_client = get_storage_client()
+    return storage_client.bucket(bucket_name).blob(blob_name).exists()
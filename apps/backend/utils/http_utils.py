@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import threading
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_COMPRESS_BYTES = 1024
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=5)
+
+
+COMPRESSORS = {"gzip": _gzip}
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+# Server preference when the client rates several encodings equally
+ENCODING_PREFERENCE = ["br", "gzip"]
+
+
+class EncodedBody:
+    """A serialized response body with its strong ETags and lazily compressed variants.
+
+    Each content-coding is a different representation, so compressed variants get their own strong ETag, the
+    body's ETag with an encoding suffix (see etag_for).
+
+    Args:
+        body: The serialized (uncompressed) response body.
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = content_etag(body)
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """Returns the body compressed with encoding, compressing it at most once."""
+        if encoding is None:
+            return self.body
+        with self._lock:
+            if encoding not in self._variants:
+                self._variants[encoding] = COMPRESSORS[encoding](self.body)
+            return self._variants[encoding]
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """The strong ETag of the variant compressed with encoding, e.g. "<hash>-gzip"."""
+        return f'{self.etag[:-1]}-{encoding}"' if encoding else self.etag
+
+    def precompress(self) -> "EncodedBody":
+        """Compresses the body with every available encoding up front."""
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            for encoding in COMPRESSORS:
+                self.encoded(encoding)
+        return self
+
+    def __len__(self):
+        return len(self.body)
+
+
+def content_etag(body: bytes) -> str:
+    """Builds a strong ETag from a hash of the serialized body."""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match header against an ETag using the weak comparison RFC 9110 requires.
+
+    The encoding suffix of a compressed variant's ETag is stripped first: any variant of an unchanged body is
+    still valid, and the 304 carries the ETag of the variant the client negotiated.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(_strip_encoding(candidate.removeprefix("W/")) == etag for candidate in candidates)
+
+
+def _strip_encoding(etag: str) -> str:
+    for encoding in COMPRESSORS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return f'{etag[:-len(suffix)]}"'
+    return etag
+
+
+def negotiate_encoding(accept_encoding: Optional[str], body_size: int) -> Optional[str]:
+    """Picks the content encoding for a response from the client's Accept-Encoding header.
+
+    Returns:
+        "br", "gzip" or None when the body should be sent uncompressed.
+    """
+    if not accept_encoding or body_size < MIN_COMPRESS_BYTES:
+        return None
+
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best_encoding, best_quality = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        if encoding not in COMPRESSORS:
+            continue
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+def build_response_headers(encoded_body: EncodedBody, encoding: Optional[str], not_modified: bool = False) -> dict:
+    """The headers of a response with the variant of encoding, a 304 keeps its ETag but has no Content-Encoding."""
+    headers = {
+        "ETag": encoded_body.etag_for(encoding),
+        "Vary": "Accept-Encoding",
+        # Let clients keep the body but always revalidate it with If-None-Match
+        "Cache-Control": "no-cache",
+    }
+    if encoding and not not_modified:
+        headers["Content-Encoding"] = encoding
+    return headers
@@ -1,38 +1,152 @@
+import atexit
+import contextvars
 import json
-import time
+import threading
+from concurrent import futures
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
 
-from google.cloud import pubsub_v1
-from google.auth import default
+from apps.backend.utils.clients import get_publisher_client
+from apps.backend.utils.constants import PUBSUB_FLUSH_TIMEOUT_SECONDS
+from apps.backend.utils.retry_utils import backoff_delay, retry_in_background
+
+# Topic paths are plain strings, no client is needed to build them
+game_status_topic = "projects/slimeify/topics/sluggers-process-game-status"
+ai_processing_topic = "projects/slimeify/topics/sluggers-ai-processing"
+
+
+class PublishBatch:
+    """The publishes of one request (or job), so flushing them never waits on other requests' messages."""
+
+    def __init__(self):
+        self.futures: List[futures.Future] = []
+        self._lock = threading.Lock()
+
+    def add(self, future: futures.Future):
+        with self._lock:
+            self.futures.append(future)
+
+    def pending(self) -> List[futures.Future]:
+        with self._lock:
+            return list(self.futures)
+
+
+# The batch of the current request, copied into the threads it hands work to (see asgi._run_in)
+_current_batch: contextvars.ContextVar = contextvars.ContextVar("pubsub_batch", default=None)
+
+
+class BatchPublisher:
+    """Publishes without waiting, so messages share the client's batches, and waits for a request's messages once.
+
+    Every publish gets callbacks logging its message ID or failure, and is added to the current PublishBatch.
+    Flushing that batch at the end of a request costs about one round trip instead of one per message. A failed
+    publish is published again from the retry executor, after a backoff, never on the request path. close()
+    waits for every outstanding publish and retry of the process, it runs at exit.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._retries = set()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def publish(self, topic: str, message: dict, description: str):
+        data = json.dumps(message).encode("utf-8")
+        future = get_publisher_client().publish(topic, data)
+        with self._lock:
+            self._pending.add(future)
+        batch = _current_batch.get()
+        if batch is not None:
+            batch.add(future)
+        future.add_done_callback(lambda done: self._on_done(done, topic, data, description))
+        return future
+
+    def _on_done(self, future, topic: str, data: bytes, description: str):
+        with self._lock:
+            self._pending.discard(future)
+        try:
+            print(f"{description}, ID: {future.result()}")
+        except Exception as e:
+            print(f"Failed to publish Pub/Sub message ({description}), publishing it again later. Error: {e}")
+            try:
+                retry = retry_in_background(_publish_and_wait, topic, data, operation="pubsub.publish",
+                                            first_delay=backoff_delay(1))
+            except RuntimeError:
+                # The retry executor is already shut down at exit, this is the last chance to publish it
+                _publish_and_wait(topic, data)
+                return
+            with self._lock:
+                self._retries.add(retry)
+            retry.add_done_callback(self._on_retry_done)
+
+    def _on_retry_done(self, retry: futures.Future):
+        with self._lock:
+            self._retries.discard(retry)
+
+    def flush(self, batch: PublishBatch, timeout: float = PUBSUB_FLUSH_TIMEOUT_SECONDS) -> int:
+        """Waits for the publishes of batch and returns how many of them failed or timed out."""
+        return _wait(batch.pending(), timeout, "Pub/Sub messages were not published")
+
+    def close(self, timeout: float = PUBSUB_FLUSH_TIMEOUT_SECONDS) -> int:
+        """Waits for every outstanding publish of the process, then for the retries of the failed ones."""
+        with self._lock:
+            pending = list(self._pending)
+        failed = _wait(pending, timeout, "Pub/Sub messages were not published")
+        with self._lock:
+            retries = list(self._retries)
+        return failed + _wait(retries, timeout, "Pub/Sub retries did not finish")
+
+
+def _wait(pending: List[futures.Future], timeout: float, message: str) -> int:
+    if not pending:
+        return 0
+    done, not_done = futures.wait(pending, timeout=timeout)
+    failed = len(not_done) + sum(1 for future in done if future.exception() is not None)
+    if failed:
+        print(f"{failed} of {len(pending)} {message}.")
+    return failed
+
+
+def _publish_and_wait(topic: str, data: bytes):
+    return get_publisher_client().publish(topic, data).result(timeout=PUBSUB_FLUSH_TIMEOUT_SECONDS)
+
+
+publisher = BatchPublisher()
+
+
+def start_publish_batch() -> PublishBatch:
+    """Starts collecting the publishes of the current request (or job) and of the threads it copies its context to."""
+    batch = PublishBatch()
+    _current_batch.set(batch)
+    return batch
+
+
+@contextmanager
+def publish_batch(timeout: float = PUBSUB_FLUSH_TIMEOUT_SECONDS) -> Iterator[PublishBatch]:
+    """Collects the publishes of the block and waits for them when it ends."""
+    batch = PublishBatch()
+    token = _current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _current_batch.reset(token)
+        publisher.flush(batch, timeout)
 
-credentials, project = default()
-# Initialize Pub/Sub Publisher
-publisher = pubsub_v1.PublisherClient()
-game_status_topic = publisher.topic_path("slimeify", "sluggers-process-game-status")
-ai_processing_topic = publisher.topic_path("slimeify", "sluggers-ai-processing")
 
 # Function to publish message to Pub/Sub to kick off Gem/Imagen processing
 def trigger_ai_processing(game_pk):
-    """Publishes a message to Pub/Sub to start AI processing."""
-    message = json.dumps({"gamePk": game_pk}).encode("utf-8")
-    future = publisher.publish(ai_processing_topic, message)
-    print(f"AI Processing triggered for game {game_pk}, ID: {future.result()}")
+    """Queues a message to Pub/Sub to start AI processing, it is sent with the next batch."""
+    return publisher.publish(ai_processing_topic, {"gamePk": game_pk}, f"AI Processing triggered for game {game_pk}")
+
 
 # Publishes a message when an upcoming game is detected
-def publish_game_status_event(game_pk, game_date, max_retries=3):
-    """Publishes a message to Pub/Sub with retry logic."""
-    message = json.dumps({"gamePk": game_pk, "gameDate": game_date}).encode("utf-8")
+def publish_game_status_event(game_pk, game_date):
+    """Queues a message to Pub/Sub for game status tracking, transient errors are retried by the client."""
+    return publisher.publish(game_status_topic, {"gamePk": game_pk, "gameDate": game_date},
+                             f"Successfully published game {game_pk} to Pub/Sub")
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            future = publisher.publish(game_status_topic, message)
-            message_id = future.result(timeout=10)  # Wait for a result
-            print(f"Successfully published game {game_pk} to Pub/Sub (Message ID: {message_id})")
-            return
-        except Exception as e:
-            print(f"Attempt {attempt}: Failed to publish Pub/Sub message for game {game_pk}. Error: {e}")
-            if attempt < max_retries:
-                wait_time = 2 ** attempt  # Exponential backoff (2s, 4s, 8s)
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"Failed to publish Pub/Sub message after {max_retries} attempts. Giving up.")
+
+def flush_publishes(batch: Optional[PublishBatch] = None, timeout: float = PUBSUB_FLUSH_TIMEOUT_SECONDS) -> int:
+    """Waits for the publishes of batch, the current one by default."""
+    batch = batch if batch is not None else _current_batch.get()
+    return publisher.flush(batch, timeout) if batch is not None else 0
@@ -0,0 +1,136 @@
+"""Process-wide token buckets in front of the Gemini, Imagen and TTS quotas, one per backend.
+
+Each bucket starts at its backend's configured quota (RATE_LIMITS_PER_MINUTE) and adapts to what the backend
+says: a 429 halves the rate and pauses the bucket for the Retry-After hint (or one interval), every success
+adds back a twentieth of the quota. When many games finish at once, their calls queue for tokens at the quota
+instead of bursting into 429s and then stalling.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from apps.backend.utils.constants import RATE_LIMITS_PER_MINUTE, RATE_LIMIT_BURST_SECONDS, \
+    RATE_LIMIT_MAX_ATTEMPTS
+from apps.backend.utils.log_util import logger
+from apps.backend.utils.retry_utils import retry_call, is_rate_limited
+
+DECREASE_FACTOR = 0.5
+INCREASE_FRACTION = 0.05
+MIN_RATE_FRACTION = 0.05
+
+
+class AdaptiveTokenBucket:
+    """A thread-safe token bucket whose rate backs off on 429s and recovers on successes, up to its ceiling.
+
+    Args:
+        name: The backend, e.g. "imagen3".
+        rate_per_minute: The quota, the highest rate the bucket runs at.
+        burst_seconds: How many seconds of tokens can be spent at once.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst_seconds: float = RATE_LIMIT_BURST_SECONDS):
+        self.name = name
+        self.ceiling = rate_per_minute / 60
+        self.rate = self.ceiling
+        self.capacity = max(1.0, self.ceiling * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.calls = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def acquire(self) -> float:
+        """Waits for a token and takes it, returning the seconds waited."""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1 and now >= self._paused_until:
+                    self._tokens -= 1
+                    self.calls += 1
+                    waited = now - started
+                    self.waited_seconds += waited
+                    return waited
+                self._condition.wait(max(self._paused_until - now, (1 - self._tokens) / self.rate))
+
+    def on_success(self):
+        with self._condition:
+            self.rate = min(self.ceiling, self.rate + self.ceiling * INCREASE_FRACTION)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Halves the rate and spends every token, pausing for retry_after seconds or one interval."""
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.ceiling * MIN_RATE_FRACTION, self.rate * DECREASE_FACTOR)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + (retry_after or 1 / self.rate))
+            self.throttled += 1
+            logger.warning(f"{self.name} is rate limited, slowing down to {self.rate * 60:.1f} calls per minute.")
+            self._condition.notify_all()
+
+    def _refill(self, now: float):
+        # No tokens are earned during a pause
+        if now > self._paused_until:
+            self._tokens = min(self.capacity, self._tokens + (now - max(self._updated, self._paused_until)) * self.rate)
+        self._updated = now
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "ratePerMinute": round(self.rate * 60, 2),
+                "ceilingPerMinute": round(self.ceiling * 60, 2),
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waitedSeconds": round(self.waited_seconds, 3),
+            }
+
+
+class RateLimiter:
+    """The buckets of every backend, created on first use.
+
+    A backend's quota is looked up by its name, e.g. "tts.en-US-Neural2-D", then by its family, "tts".
+    """
+
+    def __init__(self, rates_per_minute: Dict[str, float] = RATE_LIMITS_PER_MINUTE):
+        self.rates_per_minute = rates_per_minute
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, backend: str) -> AdaptiveTokenBucket:
+        with self._lock:
+            if backend not in self._buckets:
+                rate = self.rates_per_minute.get(backend, self.rates_per_minute.get(backend.split(".", 1)[0]))
+                if rate is None:
+                    raise ValueError(f"No rate limit is configured for {backend}")
+                self._buckets[backend] = AdaptiveTokenBucket(backend, rate)
+            return self._buckets[backend]
+
+    def call(self, backend: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls func once the backend's bucket allows it, retrying 429s after the bucket slowed down."""
+        bucket = self.bucket(backend)
+
+        def attempt():
+            bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limited(e):
+                    bucket.on_throttled(getattr(e, "retry_after", None))
+                raise
+            bucket.on_success()
+            return result
+
+        return retry_call(attempt, operation=f"rate-limited.{backend}", retry_if=is_rate_limited,
+                          max_attempts=RATE_LIMIT_MAX_ATTEMPTS)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {backend: bucket.stats() for backend, bucket in buckets.items()}
+
+
+rate_limiter = RateLimiter()
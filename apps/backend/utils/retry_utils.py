@@ -0,0 +1,149 @@
+"""Retries with jittered exponential backoff, for sync code, async code and in the background.
+
+Every retried operation is counted in retry_metrics, keyed by the operation name given by the caller.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from apps.backend.utils.constants import RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, \
+    RETRY_WORKERS
+from apps.backend.utils.log_util import logger
+
+RetryPredicate = Callable[[BaseException], bool]
+
+
+class RetryMetrics:
+    """Thread-safe attempt counters per operation."""
+
+    def __init__(self):
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, attempts: int, succeeded: bool, delay_seconds: float):
+        with self._lock:
+            counters = self._operations.setdefault(operation, {
+                "calls": 0, "attempts": 0, "retries": 0, "successes": 0, "failures": 0, "delaySeconds": 0.0,
+            })
+            counters["calls"] += 1
+            counters["attempts"] += attempts
+            counters["retries"] += attempts - 1
+            counters["successes" if succeeded else "failures"] += 1
+            counters["delaySeconds"] = round(counters["delaySeconds"] + delay_seconds, 3)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {operation: dict(counters) for operation, counters in self._operations.items()}
+
+
+retry_metrics = RetryMetrics()
+# Background retries run here so they never hold a request thread
+_retry_executor = ThreadPoolExecutor(max_workers=RETRY_WORKERS, thread_name_prefix="retry")
+
+
+def backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                  max_delay: float = RETRY_MAX_DELAY_SECONDS) -> float:
+    """The "full jitter" delay before retry number attempt: random, up to base_delay * 2 ** (attempt - 1)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def _retry_delay(error: BaseException, attempt: int, base_delay: float, max_delay: float) -> float:
+    """The backoff delay, or longer when the error carries the server's Retry-After (up to max_delay)."""
+    retry_after = getattr(error, "retry_after", None) or 0
+    return max(backoff_delay(attempt, base_delay, max_delay), min(retry_after, max_delay))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """The seconds of a Retry-After header, None when it is missing or an HTTP date (the backoff is used then)."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an error from a Google or HTTP client means the request was throttled (429).
+
+    Only the status code and the exception type are trusted, messages often hold game keys or URLs with "429" in them.
+    """
+    return getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429 \
+        or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def retry_call(func: Callable[..., Any], *args, operation: str, retry_if: RetryPredicate = lambda e: True,
+               max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY_SECONDS,
+               max_delay: float = RETRY_MAX_DELAY_SECONDS, **kwargs) -> Any:
+    """Calls func until it succeeds, an error does not match retry_if, or max_attempts is reached.
+
+    Args:
+        func: The function to call with args and kwargs.
+        operation: The name the attempts are counted under in retry_metrics.
+        retry_if: Whether an error is worth another attempt.
+        max_attempts: The number of attempts, the first one included.
+        base_delay: The backoff ceiling of the first retry, doubled on every retry.
+        max_delay: The highest backoff ceiling.
+
+    Returns:
+        The result of the first successful call, the last error is raised otherwise.
+    """
+    delayed = 0.0
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts or not retry_if(e):
+                retry_metrics.record(operation, attempt, False, delayed)
+                raise
+            delay = _retry_delay(e, attempt, base_delay, max_delay)
+            logger.warning(f"{operation}: attempt {attempt} failed ({e}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            delayed += delay
+        else:
+            retry_metrics.record(operation, attempt, True, delayed)
+            return result
+
+
+async def retry_call_async(func: Callable[..., Awaitable[Any]], *args, operation: str,
+                           retry_if: RetryPredicate = lambda e: True, max_attempts: int = RETRY_MAX_ATTEMPTS,
+                           base_delay: float = RETRY_BASE_DELAY_SECONDS, max_delay: float = RETRY_MAX_DELAY_SECONDS,
+                           **kwargs) -> Any:
+    """The async counterpart of retry_call, it waits with asyncio.sleep so the event loop keeps running."""
+    delayed = 0.0
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_attempts or not retry_if(e):
+                retry_metrics.record(operation, attempt, False, delayed)
+                raise
+            delay = _retry_delay(e, attempt, base_delay, max_delay)
+            logger.warning(f"{operation}: attempt {attempt} failed ({e}), retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            delayed += delay
+        else:
+            retry_metrics.record(operation, attempt, True, delayed)
+            return result
+
+
+def retry_in_background(func: Callable[..., Any], *args, operation: str, first_delay: float = 0.0,
+                        **kwargs) -> Future:
+    """Runs retry_call on the retry executor, after first_delay seconds, for retries nobody needs to wait on.
+
+    Use it to re-run something that already failed once on a request path, e.g. a publish.
+    """
+    def run():
+        if first_delay:
+            time.sleep(first_delay)
+        return retry_call(func, *args, operation=operation, **kwargs)
+
+    future = _retry_executor.submit(run)
+    future.add_done_callback(lambda done: _log_background_failure(done, operation))
+    return future
+
+
+def _log_background_failure(future: Future, operation: str):
+    if future.exception() is not None:
+        logger.error(f"{operation}: giving up on background retries ({future.exception()}).")